@@ -0,0 +1,115 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import explicit_created
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает HTML-страницы ленты, группы, профиля и поста с теми же '
+        'данными из JSON API: время ответа, размер и число запросов. Кэш '
+        'очищается перед каждым запросом. Данные создаются во временной '
+        'транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author, group, post = self.fill(
+                options['posts'], options['comments']
+            )
+            pairs = (
+                (reverse('posts:index'), reverse('api:posts')),
+                (
+                    reverse('posts:group_list', args=[group.slug]),
+                    reverse('api:group_posts', args=[group.slug]),
+                ),
+                (
+                    reverse('posts:profile', args=[author.username]),
+                    reverse('api:profile_posts', args=[author.username]),
+                ),
+                (
+                    reverse('posts:post_detail', args=[post.pk]),
+                    reverse('api:post_comments', args=[post.pk]),
+                ),
+            )
+            client = Client()
+            self.stdout.write(
+                f'{options["posts"]} постов, {options["repeat"]} повторов, '
+                'медиана:'
+            )
+            for pair in pairs:
+                for url in pair:
+                    median, size, queries = self.measure(
+                        client, url, options['repeat']
+                    )
+                    self.stdout.write(
+                        f'  {url:<40} {median:8.2f} мс {size:>8} байт '
+                        f'{queries:>3} запросов'
+                    )
+            transaction.set_rollback(True)
+
+    def fill(self, posts, comments):
+        author = User.objects.create_user(
+            username='bench_api', first_name='Лев', last_name='Толстой'
+        )
+        group = Group.objects.create(
+            title='Бенчмарк API', slug='bench-api', description='Описание'
+        )
+        post = Post.objects.create(author=author, text='Обсуждаемый пост')
+        start = timezone.now() - timedelta(seconds=posts)
+        with explicit_created(Post, Comment):
+            for offset in range(0, posts, BATCH_SIZE):
+                Post.objects.bulk_create(
+                    Post(
+                        author=author,
+                        group=group,
+                        text=f'Пост {i} ' * 20,
+                        created=start + timedelta(seconds=i),
+                    )
+                    for i in range(offset, min(offset + BATCH_SIZE, posts))
+                )
+            Comment.objects.bulk_create(
+                Comment(
+                    post=post,
+                    author=author,
+                    text=f'Комментарий {i}',
+                    created=start + timedelta(seconds=i),
+                )
+                for i in range(comments)
+            )
+        return author, group, post
+
+    @staticmethod
+    def measure(client, url, repeat):
+        timings = []
+        for _ in range(repeat + 1):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+        return (
+            statistics.median(timings[1:]),
+            len(response.content),
+            len(queries),
+        )
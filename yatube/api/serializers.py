@@ -0,0 +1,111 @@
+"""Сериализация строк values() в JSON API.
+
+Модели не создаются: каждый ресурс описан соответствием «поле ответа —
+колонка values()», и запрос выбирает только колонки запрошенных полей
+(?fields=id,text). Поля, нужные для курсора, выбираются всегда, но в ответ
+попадают, только если их запросили.
+"""
+from django.core.exceptions import ValidationError
+
+from posts.models import Post
+
+
+def _image_url(name):
+    if not name:
+        return None
+    return Post._meta.get_field('image').storage.url(name)
+
+
+def _full_name(row):
+    return f'{row["first_name"]} {row["last_name"]}'.strip()
+
+
+class Resource:
+    """Поля ресурса: имя в ответе -> колонка (или колонки) values().
+
+    convert получает значение колонки, а для нескольких колонок — всю
+    строку values().
+    """
+
+    def __init__(self, fields, converters=None, always=('id',)):
+        self.fields = fields
+        self.converters = converters or {}
+        self.always = always
+
+    def parse_fields(self, raw):
+        """Список полей из ?fields=; без параметра — все поля."""
+        if not raw:
+            return list(self.fields)
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValidationError(
+                'Неизвестные поля: %(fields)s',
+                params={'fields': ', '.join(unknown)},
+            )
+        return names
+
+    def columns(self, names):
+        columns = list(self.always)
+        for name in names:
+            source = self.fields[name]
+            for column in (source,) if isinstance(source, str) else source:
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def serialize(self, row, names):
+        result = {}
+        for name in names:
+            source = self.fields[name]
+            value = row[source] if isinstance(source, str) else row
+            convert = self.converters.get(name)
+            result[name] = convert(value) if convert else value
+        return result
+
+
+POST = Resource(
+    {
+        'id': 'id',
+        'text': 'text',
+        'created': 'created',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'image_width': 'image_width',
+        'image_height': 'image_height',
+    },
+    {'image': _image_url},
+    always=('id', 'created'),
+)
+
+# Число комментариев меняется без правки поста, поэтому оно есть только в
+# отдельном посте, чей ETag учитывает и комментарии.
+POST_DETAIL = Resource(
+    {**POST.fields, 'comments_count': 'comments_count'},
+    POST.converters,
+    always=POST.always,
+)
+
+COMMENT = Resource(
+    {
+        'id': 'id',
+        'post': 'post_id',
+        'text': 'text',
+        'created': 'created',
+        'author': 'author__username',
+    },
+    always=('id', 'created'),
+)
+
+PROFILE = Resource(
+    {
+        'username': 'username',
+        'full_name': ('first_name', 'last_name'),
+        'posts_count': 'counters__posts_count',
+        'followers_count': 'counters__followers_count',
+        'following_count': 'counters__following_count',
+    },
+    {'full_name': _full_name},
+    always=(),
+)
@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+from posts.views import NUMBER_OF_POSTS
+
+User = get_user_model()
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='api_author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Группа API', slug='api', description='Тестовое описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(NUMBER_OF_POSTS + 2)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(post=cls.post, author=cls.user, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'api:{name}', args=args), params)
+
+    def test_feeds_are_paginated_by_cursor(self):
+        for name, args in (
+            ('posts', ()),
+            ('group_posts', (self.group.slug,)),
+            ('profile_posts', (self.user.username,)),
+        ):
+            with self.subTest(name=name):
+                first = self.get(name, *args).json()
+                self.assertEqual(len(first['results']), NUMBER_OF_POSTS)
+                self.assertEqual(first['results'][0]['id'], self.post.pk)
+                self.assertEqual(
+                    first['results'][0]['author'], self.user.username
+                )
+                second = self.get(name, *args, cursor=first['next']).json()
+                self.assertEqual(len(second['results']), 2)
+                self.assertIsNone(second['next'])
+
+    def test_sparse_fields_and_batch(self):
+        ids = [self.posts[2].pk, self.posts[0].pk, 0]
+        response = self.get(
+            'posts', ids=','.join(map(str, ids)), fields='id,comments_count'
+        )
+        self.assertEqual(
+            response.json()['results'],
+            [
+                {'id': ids[0], 'comments_count': 0},
+                {'id': ids[1], 'comments_count': 0},
+            ],
+        )
+        response = self.get('posts', fields='id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get('posts', ids='1,x').status_code, 400)
+
+    def test_detail_comments_and_profile(self):
+        self.assertEqual(
+            self.get('post_detail', self.post.pk).json()['comments_count'], 1
+        )
+        comments = self.get('post_comments', self.post.pk).json()['results']
+        self.assertEqual([comment['text'] for comment in comments], ['Ок'])
+        self.assertEqual(
+            self.get('profile', self.user.username).json(),
+            {
+                'username': 'api_author',
+                'full_name': 'Лев Толстой',
+                'posts_count': NUMBER_OF_POSTS + 2,
+                'followers_count': 0,
+                'following_count': 0,
+            },
+        )
+        response = self.get('profile', 'nobody')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_etag(self):
+        """Неизменный ответ — 304 без запросов, правка поста меняет ETag."""
+        url = reverse('api:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.user, text='Ещё')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 2)
+
+    def test_author_rename_changes_etag(self):
+        """Новое имя автора меняет ETag поста и пакета постов."""
+        urls = [
+            reverse('api:post_detail', args=[self.post.pk]),
+            reverse('api:posts') + f'?ids={self.posts[0].pk},{self.post.pk}',
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'api_renamed'
+        user.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'api_renamed')
@@ -0,0 +1,236 @@
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_safe
+
+from core.pagecache import pages_etag
+from core.paginator import CursorPaginator
+from posts import caching
+from posts.models import Comment, Group, Post
+from posts.views import COMMENTS_PER_PAGE, NUMBER_OF_POSTS
+
+from . import serializers
+
+User = get_user_model()
+
+MAX_LIMIT = 100
+MAX_BATCH = 100
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def _error(message, status=400):
+    return _json({'detail': message}, status)
+
+
+def _limit(request, default):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        raise ValidationError('limit должен быть числом.')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValidationError(
+            'limit должен быть от 1 до %(max)s.', params={'max': MAX_LIMIT}
+        )
+    return limit
+
+
+def _page(request, queryset, resource, default_limit, ordering):
+    """Страница строк values() по курсору в формате ответа API."""
+    names = resource.parse_fields(request.GET.get('fields'))
+    paginator = CursorPaginator(
+        queryset.values(*resource.columns(names)),
+        _limit(request, default_limit),
+        ordering=ordering,
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    return {
+        'results': [resource.serialize(row, names) for row in page],
+        'next': paginator.next_cursor,
+        'previous': paginator.previous_cursor,
+    }
+
+
+def _posts_page(request, queryset):
+    return _page(
+        request,
+        queryset,
+        serializers.POST,
+        NUMBER_OF_POSTS,
+        ('-created', '-id'),
+    )
+
+
+def api_view(pages, scopes=None):
+    """GET-обработчик API: ETag по страницам сайта с теми же данными.
+
+    pages(request, **kwargs) возвращает пути HTML-страниц; их purge при
+    изменении постов, комментариев и подписок меняет и ETag ответа, так
+    что на неизменные данные отвечается 304 без запросов к базе.
+    Данные, которых нет на самих страницах (имя автора на странице поста),
+    добавляются областями scopes(request, **kwargs).
+    Ошибки разбора параметров становятся ответом 400.
+    """
+    def etag(request, *args, **kwargs):
+        return pages_etag(
+            request,
+            *pages(request, **kwargs),
+            scopes=scopes(request, **kwargs) if scopes else (),
+        )
+
+    def decorator(view):
+        @wraps(view)
+        def handle(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except ValidationError as error:
+                return _error(' '.join(error.messages))
+
+        conditional = condition(etag_func=etag)(handle)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Ошибку не с чем сверять: 404 не должен стать 304, когда
+            # ресурс появится.
+            if response.status_code >= 400:
+                del response['ETag']
+            return response
+        return require_safe(wrapper)
+    return decorator
+
+
+def _batch_ids(request):
+    try:
+        ids = [int(pk) for pk in request.GET['ids'].split(',') if pk]
+    except ValueError:
+        raise ValidationError('ids должен быть списком чисел через запятую.')
+    if len(ids) > MAX_BATCH:
+        raise ValidationError(
+            'Не больше %(max)s id за запрос.', params={'max': MAX_BATCH}
+        )
+    return ids
+
+
+def _feed_pages(request):
+    if 'ids' not in request.GET:
+        return [reverse('posts:index')]
+    try:
+        ids = _batch_ids(request)
+    except ValidationError:
+        return []
+    return [reverse('posts:post_detail', args=[pk]) for pk in ids]
+
+
+def _feed_scopes(request):
+    if 'ids' not in request.GET:
+        return []
+    try:
+        return caching.shown_post_scopes(_batch_ids(request))
+    except ValidationError:
+        return []
+
+
+@api_view(_feed_pages, _feed_scopes)
+def posts(request):
+    """Лента всех постов или пакет постов по ?ids=1,2,3."""
+    if 'ids' not in request.GET:
+        return _json(_posts_page(request, Post.objects.all()))
+    ids = _batch_ids(request)
+    resource = serializers.POST_DETAIL
+    names = resource.parse_fields(request.GET.get('fields'))
+    rows = {
+        row['id']: row
+        for row in Post.objects.filter(pk__in=ids).values(
+            *resource.columns(names)
+        )
+    }
+    return _json({
+        'results': [
+            resource.serialize(rows[pk], names) for pk in ids if pk in rows
+        ],
+    })
+
+
+def _group_pages(request, slug):
+    return [reverse('posts:group_list', args=[slug])]
+
+
+@api_view(_group_pages)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    if group_id is None:
+        return _error('Группа не найдена.', 404)
+    return _json(
+        _posts_page(request, Post.objects.filter(group_id=group_id))
+    )
+
+
+def _profile_pages(request, username):
+    return [reverse('posts:profile', args=[username])]
+
+
+@api_view(_profile_pages)
+def profile(request, username):
+    resource = serializers.PROFILE
+    names = resource.parse_fields(request.GET.get('fields'))
+    row = User.objects.filter(username=username).values(
+        *resource.columns(names)
+    ).first()
+    if row is None:
+        return _error('Пользователь не найден.', 404)
+    return _json(resource.serialize(row, names))
+
+
+@api_view(_profile_pages)
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        return _error('Пользователь не найден.', 404)
+    return _json(
+        _posts_page(request, Post.objects.filter(author_id=author_id))
+    )
+
+
+def _post_pages(request, post_id):
+    return [reverse('posts:post_detail', args=[post_id])]
+
+
+def _post_scopes(request, post_id):
+    return caching.shown_post_scopes([post_id])
+
+
+@api_view(_post_pages, _post_scopes)
+def post_detail(request, post_id):
+    resource = serializers.POST_DETAIL
+    names = resource.parse_fields(request.GET.get('fields'))
+    row = Post.objects.filter(pk=post_id).values(
+        *resource.columns(names)
+    ).first()
+    if row is None:
+        return _error('Пост не найден.', 404)
+    return _json(resource.serialize(row, names))
+
+
+@api_view(_post_pages)
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return _error('Пост не найден.', 404)
+    return _json(_page(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        serializers.COMMENT,
+        COMMENTS_PER_PAGE,
+        ('created', 'id'),
+    ))
@@ -0,0 +1,317 @@
+"""Кэш на SQLite, общий для всех процессов одного хоста.
+
+LocMemCache живёт внутри процесса: у каждого воркера gunicorn своя копия,
+и сброс поколения в одном воркере не виден остальным. SQLiteCache хранит
+записи в одном файле в режиме WAL: читатели не блокируют писателя, а
+запись видна всем процессам сразу.
+
+Настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+
+MAX_ENTRIES и MAX_SIZE (в байтах) ограничивают кэш; при превышении
+сначала удаляются просроченные записи, затем давно не читавшиеся (LRU).
+Целые числа хранятся как INTEGER, поэтому incr атомарен между процессами.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_totals VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_totals
+    SET entries = entries + 1, size = size + new.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_totals
+    SET entries = entries - 1, size = size - old.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_totals SET size = size - old.size + new.size WHERE id = 1;
+END;
+'''
+
+# Время последнего чтения обновляется не чаще раза в столько секунд,
+# чтобы чтения не превращались в записи.
+ACCESS_RESOLUTION = 10
+
+SQLITE_MAX_VARIABLES = 900
+
+
+def is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """Видят ли другие процессы записи этого кэша.
+
+    Фоновым командам (thumbnail_worker) нужен общий кэш: иначе поколения
+    и найденные миниатюры, которые они записывают, остаются в их
+    собственном LocMemCache.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def _chunked(items, size=SQLITE_MAX_VARIABLES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 0)) or None
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        local = self._local
+        # После fork соединение родителя использовать нельзя.
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _execute(self, sql, params=()):
+        return self._connection.execute(sql, params)
+
+    def _write(self, statements):
+        """Выполнить запросы в одной транзакции записи."""
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            results = [connection.execute(sql, params).fetchall()
+                       for sql, params in statements]
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return results
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return value, 8
+        data = pickle.dumps(value, SQLiteCache.pickle_protocol)
+        return data, len(data)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _upsert(self, key, value, timeout, only_new=False):
+        data, size = self._encode(value)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        if only_new:
+            statements = [
+                ('DELETE FROM cache WHERE key = ? AND expires <= ?',
+                 (key, now)),
+                ('INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?, ?)',
+                 (key, data, expires, now, size)),
+                ('SELECT changes()', ()),
+            ]
+        else:
+            statements = [
+                ('INSERT INTO cache VALUES (?, ?, ?, ?, ?) '
+                 'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                 'expires = excluded.expires, accessed = excluded.accessed, '
+                 'size = excluded.size',
+                 (key, data, expires, now, size)),
+            ]
+        results = self._write(statements)
+        self._cull()
+        return not only_new or results[-1][0][0] == 1
+
+    def _cull(self):
+        entries, size = self._execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        over_entries = entries > self._max_entries
+        over_size = self._max_size is not None and size > self._max_size
+        if not (over_entries or over_size):
+            return
+        entries, size = self._write([
+            ('DELETE FROM cache WHERE expires <= ?', (time.time(),)),
+            ('SELECT entries, size FROM cache_totals', ()),
+        ])[-1][0]
+        over_entries = entries > self._max_entries
+        over_size = self._max_size is not None and size > self._max_size
+        if not (over_entries or over_size):
+            # Хватило удаления просроченных записей.
+            return
+        # Как и LocMemCache, вытесняем долю записей, а не по одной.
+        victims = max(entries // self._cull_frequency, 1)
+        self._execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (victims,),
+        )
+
+    def _touch_accessed(self, keys):
+        if keys:
+            now = time.time()
+            for chunk in _chunked(keys):
+                self._execute(
+                    'UPDATE cache SET accessed = ? WHERE key IN ({})'.format(
+                        ', '.join('?' * len(chunk))
+                    ),
+                    [now, *chunk],
+                )
+
+    def _fetch(self, keys):
+        now = time.time()
+        found, stale = {}, []
+        for chunk in _chunked(keys):
+            rows = self._execute(
+                'SELECT key, value, accessed FROM cache '
+                'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+                .format(', '.join('?' * len(chunk))),
+                [*chunk, now],
+            )
+            for key, value, accessed in rows:
+                found[key] = self._decode(value)
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+        self._touch_accessed(stale)
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._upsert(key, value, timeout, only_new=True)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._upsert(self._key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        statements = []
+        for key, value in data.items():
+            encoded, size = self._encode(value)
+            statements.append((
+                'INSERT INTO cache VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires, accessed = excluded.accessed, '
+                'size = excluded.size',
+                (self._key(key, version), encoded, expires, now, size),
+            ))
+        if statements:
+            self._write(statements)
+            self._cull()
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._execute(
+            'UPDATE cache SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self._execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        for chunk in _chunked(keys):
+            self._execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                chunk,
+            )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно, одним UPDATE, даже при записи из разных процессов."""
+        key = self._key(key, version)
+        row = self._execute(
+            'UPDATE cache SET value = value + ? '
+            'WHERE key = ? AND typeof(value) = \'integer\' '
+            'AND (expires IS NULL OR expires > ?) RETURNING value',
+            (delta, key, time.time()),
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        # Не целое число (например, float) хранится pickle; ключ уже
+        # построен make_key, поэтому get() и set() здесь не подходят.
+        found = self._fetch([key])
+        if key not in found:
+            raise ValueError("Key '%s' not found" % key)
+        new_value = found[key] + delta
+        data, size = self._encode(new_value)
+        self._execute(
+            'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+            (data, size, key),
+        )
+        return new_value
+
+    def clear(self):
+        self._execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами потока.
+        pass
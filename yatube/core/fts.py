@@ -0,0 +1,37 @@
+"""Полнотекстовый поиск на SQLite FTS5.
+
+В виртуальную таблицу пишутся основы слов (см. core.stemmer), запрос
+перед MATCH проходит тот же стеммер. Модель над такой таблицей —
+неуправляемая (managed = False), таблицу создаёт миграция.
+"""
+from django.db import models
+
+from .stemmer import tokens
+
+
+class SearchField(models.TextField):
+    """Колонка FTS5, поддерживает lookup match."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def document(text):
+    """Текст в том виде, в котором он хранится в индексе."""
+    return ' '.join(tokens(text))
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов запроса, каждая в кавычках.
+
+    Кавычки экранируют операторы FTS5 (AND, NEAR, *), так что ввод
+    пользователя не ломает синтаксис. Пустая строка — искать нечего.
+    """
+    return ' '.join(f'"{token}"' for token in tokens(query))
@@ -0,0 +1,76 @@
+"""Поколения (generation counters) для версионирования ключей кэша.
+
+Вместо удаления закэшированных фрагментов номер поколения области
+(например, всей ленты или одной группы) входит в ключ фрагмента.
+Запись в область увеличивает номер, и старые фрагменты просто перестают
+запрашиваться, а потом вытесняются по TTL.
+"""
+import time
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'generation:'
+CHANGED_PREFIX = 'generation-changed:'
+
+
+def _key(scope):
+    return f'{KEY_PREFIX}{scope}'
+
+
+def _changed_key(scope):
+    return f'{CHANGED_PREFIX}{scope}'
+
+
+def _initial():
+    # После вытеснения счётчика новое значение не совпадёт с прежними.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """Текущие поколения областей одним обращением к кэшу."""
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    result = {}
+    for scope, key in zip(scopes, keys):
+        if key not in found:
+            cache.add(key, _initial(), None)
+            # Раньше появления счётчика область не менялась — для
+            # Last-Modified это безопасная оценка.
+            cache.add(_changed_key(scope), time.time(), None)
+            found[key] = cache.get(key)
+        result[scope] = found[key]
+    return result
+
+
+def get_generation(scope):
+    return get_generations(scope)[scope]
+
+
+def version(*scopes):
+    """Строка поколений для ключа фрагмента, например «17.4»."""
+    generations = get_generations(*scopes)
+    return '.'.join(str(generations[scope]) for scope in scopes)
+
+
+def last_changed(*scopes):
+    """Время (timestamp) последнего bump среди областей или None.
+
+    None означает, что время изменения неизвестно: запись о нём была
+    вытеснена из кэша.
+    """
+    found = cache.get_many([_changed_key(scope) for scope in scopes])
+    if len(found) < len(scopes):
+        return None
+    return max(found.values())
+
+
+def bump(*scopes):
+    """Начать новое поколение у каждой из областей."""
+    for scope in scopes:
+        key = _key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+    now = time.time()
+    cache.set_many({_changed_key(scope): now for scope in scopes}, None)
@@ -0,0 +1,108 @@
+"""Нормализация загружаемых картинок.
+
+Оригиналы с камер весят мегабайты, и каждое построение миниатюры заново
+декодирует их целиком. normalize() вызывается до сохранения файла:
+уменьшает картинку до UPLOAD_IMAGE_MAX_SIDE по большей стороне,
+поворачивает её по EXIF и удаляет метаданные, а затем перекодирует в
+прогрессивный JPEG (или WebP/PNG при прозрачности) с заданным качеством.
+Огромные по числу пикселей файлы (decompression bomb) отклоняются по
+заголовку, до декодирования.
+"""
+import io
+import os
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.forms import ImageField
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+
+def _open(file):
+    """Открыть картинку, проверив число пикселей до декодирования."""
+    file.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            image = Image.open(file)
+        except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+            image = None
+    if image is None or (
+        image.width * image.height > settings.UPLOAD_IMAGE_MAX_PIXELS
+    ):
+        # Мегапиксели с округлением при маленьком пределе показали бы 0.
+        pixels = f'{settings.UPLOAD_IMAGE_MAX_PIXELS:,}'.replace(',', ' ')
+        raise ValidationError(
+            'Картинка слишком большая: не больше %(pixels)s пикселей.',
+            code='image_too_large',
+            params={'pixels': pixels},
+        )
+    return image
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _output_format(image):
+    if _has_alpha(image):
+        return 'WEBP' if features.check('webp') else 'PNG'
+    if settings.UPLOAD_IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'JPEG'
+
+
+def _encode(image, format):
+    buffer = io.BytesIO()
+    if format == 'JPEG':
+        image.convert('RGB').save(
+            buffer, 'JPEG', quality=settings.UPLOAD_IMAGE_QUALITY,
+            progressive=settings.UPLOAD_IMAGE_PROGRESSIVE, optimize=True,
+        )
+    elif format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=settings.UPLOAD_IMAGE_QUALITY)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def normalize(file):
+    """Нормализованная копия загруженной картинки (ContentFile).
+
+    Исходный файл возвращается как есть, если его не нужно уменьшать, в
+    нём нет EXIF, а перекодирование не делает его меньше. Анимированные
+    картинки не перекодируются.
+    """
+    image = _open(file)
+    if getattr(image, 'is_animated', False):
+        file.seek(0)
+        return file
+    max_side = settings.UPLOAD_IMAGE_MAX_SIDE
+    too_big = max(image.size) > max_side
+    # Метаданные удаляются перекодированием, а ориентация применяется.
+    has_exif = bool(image.getexif())
+    if image.format == 'JPEG' and too_big:
+        # JPEG умеет декодировать сразу в уменьшенном в 2-8 раз размере.
+        image.draft('RGB', (max_side, max_side))
+    try:
+        image = ImageOps.exif_transpose(image)
+        if too_big:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        format = _output_format(image)
+        data = _encode(image, format)
+    except OSError:
+        # Заголовок прочитан, а данные обрезаны или повреждены.
+        raise ValidationError(
+            ImageField.default_error_messages['invalid_image'],
+            code='invalid_image',
+        )
+    if not (too_big or has_exif) and len(data) >= file.size:
+        file.seek(0)
+        return file
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    return ContentFile(data, name=f'{stem}.{EXTENSIONS[format]}')
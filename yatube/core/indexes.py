@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+
+from django.db import NotSupportedError, connection
+
+
+@contextmanager
+def without_indexes(*models):
+    """Удаляет неуникальные индексы таблиц моделей на время блока.
+
+    Массовая вставка в таблицу без вторичных индексов быстрее, а один
+    CREATE INDEX после загрузки дешевле, чем обновление индекса на каждую
+    строку. Уникальные индексы остаются: они защищают от дублей.
+    Поддерживается только SQLite — текст индексов берётся из sqlite_master.
+    Блок должен выполняться в транзакции: при ошибке откат вернёт и
+    удалённые индексы.
+    """
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError('Индексы отключаются только в SQLite.')
+    if not connection.in_atomic_block:
+        raise NotSupportedError('Индексы отключаются только в транзакции.')
+    tables = [model._meta.db_table for model in models]
+    placeholders = ', '.join(['%s'] * len(tables))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            f'AND sql IS NOT NULL AND tbl_name IN ({placeholders})',
+            tables,
+        )
+        indexes = [
+            (name, sql) for name, sql in cursor.fetchall()
+            if not sql.upper().startswith('CREATE UNIQUE')
+        ]
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    yield [name for name, _ in indexes]
+    with connection.cursor() as cursor:
+        for _, sql in indexes:
+            cursor.execute(sql)
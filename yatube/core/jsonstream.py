@@ -0,0 +1,121 @@
+"""Потоковое чтение больших JSON- и JSONL-файлов.
+
+json.load читает и разбирает файл целиком. Здесь файл читается кусками
+по CHUNK_SIZE символов, а в памяти одновременно лежит только текущий
+кусок и разобранный элемент.
+"""
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Непрочитанный хвост файла и позиция разбора в нём."""
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """Дочитать кусок файла; False, если файл кончился."""
+        chunk = self.file.read(self.chunk_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def next_char(self):
+        """Следующий непробельный символ или None в конце файла."""
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def decode(self):
+        """Разобрать значение с текущей позиции, дочитывая файл."""
+        while True:
+            try:
+                item, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # Число на границе куска могло прочитаться не целиком.
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return item
+            self.fill()
+
+
+def iter_array(file, chunk_size=CHUNK_SIZE):
+    """Элементы JSON-массива верхнего уровня по одному."""
+    reader = _Buffer(file, chunk_size)
+    if reader.next_char() != '[':
+        raise ValueError('Ожидался JSON-массив.')
+    reader.position += 1
+    while True:
+        char = reader.next_char()
+        if char == ']':
+            return
+        if char is None:
+            raise ValueError('JSON-массив оборван.')
+        if char == ',':
+            reader.position += 1
+            continue
+        yield reader.decode()
+
+
+def iter_lines(file):
+    """Объекты JSONL, по одному на непустую строку."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_records(file):
+    """Записи JSON-массива или JSONL, формат — по первому символу."""
+    head = ''
+    while not head.strip():
+        chunk = file.read(1)
+        if not chunk:
+            return iter(())
+        head += chunk
+    rest = _Prefixed(head, file)
+    if head.strip() == '[':
+        return iter_array(rest)
+    return iter_lines(rest)
+
+
+class _Prefixed:
+    """Файл, к началу которого возвращены уже прочитанные символы."""
+
+    def __init__(self, prefix, file):
+        self.prefix = prefix
+        self.file = file
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.file.read(size)
+        data, self.prefix = self.prefix, ''
+        if size < 0:
+            return data + self.file.read()
+        return data + self.file.read(max(size - len(data), 0))
+
+    def __iter__(self):
+        if self.prefix:
+            line = self.prefix + self.file.readline()
+            self.prefix = ''
+            yield line
+        yield from self.file
@@ -0,0 +1,110 @@
+"""Нагрузка на WSGI-приложение в том же процессе.
+
+Запросы проходят весь путь реального сервера — middleware, сессии,
+кэш страниц, — но без сети, поэтому время ответа — это время Django и
+базы. Для каждого запроса считаются время, статус и число SQL-запросов.
+"""
+import io
+import resource
+import time
+from importlib import import_module
+from urllib.parse import unquote_to_bytes
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+)
+from django.db import connection
+
+
+def peak_memory():
+    """Пиковый RSS процесса в мегабайтах (ru_maxrss в Linux — в КБ)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу; values должны быть отсортированы."""
+    if not values:
+        return None
+    rank = max(round(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summary(timings):
+    """p50/p95/p99, среднее и максимум времени в миллисекундах."""
+    timings = sorted(timings)
+    return {
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'mean': sum(timings) / len(timings) if timings else None,
+        'max': timings[-1] if timings else None,
+    }
+
+
+def session_cookie(user):
+    """Cookie сессии, в которой пользователь уже вошёл (как force_login)."""
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+class Driver:
+    """Вызывает WSGI-приложение напрямую, как это делал бы сервер."""
+
+    def __init__(self, application=None):
+        if application is None:
+            from yatube.wsgi import application
+        self.application = application
+
+    @staticmethod
+    def environ(method, path, query='', cookie=None):
+        """WSGI-окружение запроса; path — как в URL, с %-кодированием."""
+        # По PEP 3333 строки окружения — байты запроса в latin-1.
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': unquote_to_bytes(path).decode('iso-8859-1'),
+            'QUERY_STRING': query.encode().decode('iso-8859-1'),
+            'wsgi.input': io.BytesIO(),
+        }
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        setup_testing_defaults(environ)
+        return environ
+
+    def request(self, method, path, query='', cookie=None):
+        """Выполнить запрос; вернуть (статус, миллисекунды, SQL-запросов).
+
+        Тело ответа читается целиком: потоковые ответы тоже оплачиваются.
+        """
+        status = []
+        queries = 0
+
+        def start_response(value, headers, exc_info=None):
+            status.append(int(value.split()[0]))
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        # Обёртка живёт на соединении потока и переживает его закрытие
+        # в конце запроса; queries_log для этого не годится — Django
+        # очищает его в начале каждого запроса.
+        with connection.execute_wrapper(count):
+            response = self.application(
+                self.environ(method, path, query, cookie), start_response
+            )
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        return status[0], elapsed, queries
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = (
+    ('locmem', 'django.core.cache.backends.locmem.LocMemCache'),
+    ('filebased', 'django.core.cache.backends.filebased.FileBasedCache'),
+    ('sqlite', 'core.cache_backends.SQLiteCache'),
+)
+
+VALUE = 'x' * 2048
+
+
+def _work(backend, location, keys, operations, seed):
+    """Типичный read-through: get, при промахе — вычислить и set."""
+    cache = import_string(backend)(
+        location, {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': keys * 2}}
+    )
+    rng = random.Random(seed)
+    # Ключи распределены неравномерно, как популярность страниц.
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    choices = rng.choices(range(keys), weights, k=operations)
+    hits = 0
+    start = time.perf_counter()
+    for index in range(0, operations, 10):
+        batch = [f'bench:{key}' for key in choices[index:index + 10]]
+        found = cache.get_many(batch)
+        hits += sum(1 for key in batch if key in found)
+        missing = {key: VALUE for key in batch if key not in found}
+        if missing:
+            cache.set_many(missing)
+    return hits, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и SQLiteCache под нагрузкой '
+        'из нескольких процессов: операций в секунду и долю попаданий.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--operations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        keys, operations = options['keys'], options['operations']
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            f'{processes} процессов, {operations} чтений на процесс, '
+            f'{keys} ключей'
+        )
+        for name, backend in BACKENDS:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, name)
+                if name == 'locmem':
+                    location = 'bench'
+                with context.Pool(processes) as pool:
+                    results = pool.starmap(
+                        _work,
+                        [
+                            (backend, location, keys, operations, seed)
+                            for seed in range(processes)
+                        ],
+                    )
+            hits = sum(result[0] for result in results)
+            elapsed = max(result[1] for result in results)
+            total = processes * operations
+            self.stdout.write(
+                f'{name:>10}: {total / elapsed:10.0f} оп/с, '
+                f'доля попаданий {hits / total:.1%}'
+            )
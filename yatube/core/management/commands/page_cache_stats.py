@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import pagecache
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша страниц для анонимов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики.'
+        )
+
+    def handle(self, *args, **options):
+        stats = pagecache.stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["ratio"]:.1%}'
+        )
+        if options['reset']:
+            pagecache.reset_stats()
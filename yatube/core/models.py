@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from django.db import models
 
 
@@ -11,3 +13,34 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+@contextmanager
+def explicit_created(*models):
+    """Отключает auto_now_add у поля created на время массовой вставки.
+
+    bulk_create всегда проставляет auto_now_add текущим временем; внутри
+    контекста сохраняются даты, заданные у объектов явно.
+    """
+    fields = [model._meta.get_field('created') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class StoredFile(models.Model):
+    """Число ссылок на файл в хранилище с адресацией по содержимому.
+
+    Одинаковые загрузки хранятся одним файлом (core.storage), и удалять
+    его можно, только когда на него не ссылается ни одна запись.
+    """
+    name = models.CharField(
+        verbose_name='Имя файла', max_length=255, primary_key=True
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Число ссылок', default=0
+    )
@@ -0,0 +1,177 @@
+"""Кэш целых страниц для анонимных посетителей и условные GET.
+
+Ответ кэшируется по пути и строке запроса. В ключ входит поколение пути
+(core.generations), поэтому purge(path) сразу отбрасывает все варианты
+страницы, в том числе с разными ?cursor=. Счётчики попаданий и промахов
+лежат в том же кэше и показываются командой page_cache_stats.
+
+Тем же поколением пути подписываются ETag и Last-Modified: conditional_page
+отвечает 304 до запросов к базе и рендеринга шаблонов.
+
+Страница может зависеть и от данных, которых нет в её пути (например,
+страница поста показывает счётчик постов автора). Такие области вид
+перечисляет функцией scopes(request, *args, **kwargs): их поколения входят
+и в ключ кэша, и в валидаторы, поэтому bump любой из них сбрасывает
+страницу без purge каждого пути.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from . import generations
+
+HITS_KEY = 'pagecache:hits'
+MISSES_KEY = 'pagecache:misses'
+
+
+def page_scope(path):
+    return f'page:{path}'
+
+
+def purge(*paths):
+    """Сбросить закэшированные варианты страниц по их путям."""
+    generations.bump(*(page_scope(path) for path in paths))
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    """Попадания, промахи и доля попаданий."""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def request_scopes(request, scopes=None, *args, **kwargs):
+    """Области страницы: её путь и области из scopes вида.
+
+    Запоминаются на запросе: их читают и кэш, и оба валидатора.
+    """
+    if not hasattr(request, '_page_scopes'):
+        request._page_scopes = [page_scope(request.path)]
+        if scopes is not None:
+            request._page_scopes += scopes(request, *args, **kwargs)
+    return request._page_scopes
+
+
+def _cache_key(request, scopes):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'pagecache:{digest}:{generations.version(*scopes)}'
+
+
+def _is_cacheable(request, response):
+    # Страница с {% csrf_token %} или новыми cookie индивидуальна.
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not response.has_header('Cache-Control')
+    )
+
+
+def anonymous_page_cache(view=None, *, scopes=None):
+    """Отдаёт анонимным GET/HEAD-запросам страницу из кэша."""
+    if view is None:
+        return partial(anonymous_page_cache, scopes=scopes)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated
+        ):
+            return view(request, *args, **kwargs)
+        key = _cache_key(
+            request, request_scopes(request, scopes, *args, **kwargs)
+        )
+        response = cache.get(key)
+        if response is not None:
+            _count(HITS_KEY)
+            response['X-Page-Cache'] = 'HIT'
+            return response
+        _count(MISSES_KEY)
+        response = view(request, *args, **kwargs)
+        if _is_cacheable(request, response):
+            cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def _visitor(request):
+    """Кто смотрит страницу.
+
+    У вошедшего пользователя это и сессия, и секрет CSRF: после повторного
+    входа оба меняются, и браузер не получит 304 на страницу с формой и
+    устаревшим csrf-токеном.
+    """
+    if not request.user.is_authenticated:
+        return ''
+    return ':'.join((
+        str(request.user.pk),
+        request.session.session_key or '',
+        request.META.get('CSRF_COOKIE', ''),
+    ))
+
+
+def page_etag(request, *args, scopes=None, **kwargs):
+    """Валидатор страницы: поколения её областей, сам URL и посетитель."""
+    version = generations.version(
+        *request_scopes(request, scopes, *args, **kwargs)
+    )
+    raw = f'{version}:{request.get_full_path()}:{_visitor(request)}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def pages_etag(request, *paths, scopes=()):
+    """Валидатор ответа, собранного из данных страниц paths.
+
+    Не зависит от пользователя: годится для ответов, одинаковых для всех
+    (например, JSON API), и меняется вместе с purge любой из страниц или
+    bump любой из областей scopes.
+    """
+    found = generations.get_generations(
+        *(page_scope(path) for path in paths), *scopes
+    )
+    raw = ':'.join(str(generation) for generation in found.values())
+    raw += f':{request.get_full_path()}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_last_modified(request, *args, scopes=None, **kwargs):
+    changed = generations.last_changed(
+        *request_scopes(request, scopes, *args, **kwargs)
+    )
+    if changed is None:
+        return None
+    return datetime.fromtimestamp(changed, tz=timezone.utc)
+
+
+def conditional_page(view=None, *, scopes=None):
+    """ETag и Last-Modified по областям страницы, 304 до рендеринга."""
+    if view is None:
+        return partial(conditional_page, scopes=scopes)
+    return condition(
+        etag_func=partial(page_etag, scopes=scopes),
+        last_modified_func=partial(page_last_modified, scopes=scopes),
+    )(view)
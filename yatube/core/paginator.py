@@ -0,0 +1,205 @@
+import base64
+import binascii
+import datetime
+import json
+from operator import attrgetter
+
+from django.core.paginator import Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Сохраняет микросекунды: DjangoJSONEncoder обрезает их до
+    миллисекунд, и граница страницы сдвигалась бы."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, number, values):
+    """Упаковывает направление, номер страницы и значения ключа в токен."""
+    raw = json.dumps(
+        [direction, number, list(values)],
+        cls=CursorEncoder,
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает токен. Для пустого или битого токена вернёт None."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, number, values = json.loads(raw.decode())
+        number = int(number)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or number < 1:
+        return None
+    if not isinstance(values, list):
+        return None
+    return direction, number, values
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (keyset) вместо OFFSET/LIMIT.
+
+    Страница выбирается условием «после/до граничной записи» по полям
+    ordering, поэтому глубокие страницы стоят столько же, сколько первая,
+    а COUNT(*) не выполняется вовсе. Ссылки на соседние страницы —
+    непрозрачные токены next_cursor/previous_cursor, которые не «съезжают»
+    при появлении новых записей.
+
+    Возвращает обычный Page: number — порядковый номер страницы от начала
+    ленты, num_pages известен лишь на шаг вперёд.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-created', '-id')):
+        self.ordering = tuple(ordering)
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+        self.cursor = None
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def _fields(self):
+        return [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+    def _key(self, obj):
+        # Строки values() — словари, у моделей поля берутся атрибутами.
+        if isinstance(obj, dict):
+            return [obj[name] for name, _ in self._fields()]
+        return [getattr(obj, name) for name, _ in self._fields()]
+
+    def _seek(self, values, direction):
+        """Условие «строго после граничной записи» в нужном направлении.
+
+        Нестрогая граница по первому полю дублирует условие, но позволяет
+        СУБД начать чтение индекса сразу с нужного места, а не сканировать
+        его от начала.
+        """
+        condition = Q()
+        equal = {}
+        bound = None
+        for (name, descending), value in zip(self._fields(), values):
+            forward = descending != (direction == PREVIOUS)
+            lookup = 'lt' if forward else 'gt'
+            if bound is None:
+                bound = Q(**{f'{name}__{lookup}e': value})
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return bound & condition
+
+    def _fetch(self, values, direction, limit):
+        return self._fetch_from(self.object_list, values, direction, limit)
+
+    def _fetch_from(self, queryset, values, direction, limit):
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, direction))
+        return list(queryset[:limit])
+
+    def get_page(self, cursor=None):
+        """Вернуть страницу по токену; битый токен ведёт на первую."""
+        state = decode_cursor(cursor)
+        if state is not None and len(state[2]) != len(self.ordering):
+            state = None
+        if state is None:
+            return self._first_page()
+        direction, number, values = state
+        rows = self._fetch(values, direction, self.per_page + 1)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            return self._first_page()
+        if direction == NEXT:
+            self.cursor = cursor
+            return self._build_page(rows, number, more, True)
+        if not more:
+            return self._first_page()
+        self.cursor = cursor
+        return self._build_page(rows[::-1], max(number, 2), True, True)
+
+    def _first_page(self):
+        rows = self._fetch(None, NEXT, self.per_page + 1)
+        more = len(rows) > self.per_page
+        return self._build_page(rows[:self.per_page], 1, more, False)
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        if rows and has_next:
+            self.next_cursor = encode_cursor(
+                NEXT, number + 1, self._key(rows[-1])
+            )
+        if rows and has_previous:
+            self.previous_cursor = encode_cursor(
+                PREVIOUS, number - 1, self._key(rows[0])
+            )
+        self._num_pages = number + 1 if self.next_cursor else number
+        return Page(rows, number, self)
+
+    def state(self, page):
+        """Состав страницы для кэша: номер, курсоры и pk строк."""
+        return {
+            'number': page.number,
+            'pks': [obj.pk for obj in page],
+            'cursor': self.cursor,
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+        }
+
+    def restore(self, state):
+        """Страница из state(): строки читаются одним запросом по pk.
+
+        Строки, удалённые после сохранения состава, пропускаются.
+        """
+        self.cursor = state['cursor']
+        self.next_cursor = state['next_cursor']
+        self.previous_cursor = state['previous_cursor']
+        number = state['number']
+        self._num_pages = number + 1 if self.next_cursor else number
+        objects = self.object_list.in_bulk(state['pks'])
+        rows = [objects[pk] for pk in state['pks'] if pk in objects]
+        return Page(rows, number, self)
+
+
+class MergeCursorPaginator(CursorPaginator):
+    """Курсорный пагинатор поверх нескольких выборок.
+
+    Каждая выборка читается своим диапазоном индекса, результаты
+    склеиваются по ключу ordering; повторяющиеся объекты (один и тот же pk
+    из разных выборок) попадают на страницу один раз.
+    """
+
+    def __init__(self, object_lists, per_page, ordering=('-created', '-id')):
+        super().__init__(object_lists[0], per_page, ordering)
+        self.sources = [
+            queryset.order_by(*self.ordering) for queryset in object_lists
+        ]
+
+    def _fetch(self, values, direction, limit):
+        rows = {}
+        for queryset in self.sources:
+            for obj in self._fetch_from(queryset, values, direction, limit):
+                rows.setdefault(obj.pk, obj)
+        rows = list(rows.values())
+        for name, descending in reversed(self._fields()):
+            rows.sort(
+                key=attrgetter(name),
+                reverse=descending != (direction == PREVIOUS),
+            )
+        return rows[:limit]
@@ -0,0 +1,90 @@
+"""Стеммер русского языка по алгоритму Snowball (Портера).
+
+Токенизаторы SQLite не знают морфологии, поэтому в полнотекстовый индекс
+и в запрос попадают уже обрезанные до основы слова: «котами», «коту» и
+«кот» дают одну основу «кот». Слова на других языках только приводятся
+к нижнему регистру.
+"""
+import re
+
+WORD = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+RV = re.compile(f'[{VOWELS}]')
+REGION = re.compile(f'[{VOWELS}][^{VOWELS}]')
+
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(ся|сь)$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'(ост|ость)$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def _cut(pattern, text):
+    """Обрезать окончание; вторым значением — нашлось ли оно."""
+    match = pattern.search(text)
+    if match is None:
+        return text, False
+    return text[:match.start()], True
+
+
+def _region(word, start=0):
+    """Начало области R1 (или R2, если передать начало R1)."""
+    match = REGION.search(word, start)
+    return match.end() if match else len(word)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    match = RV.search(word)
+    if match is None:
+        return word
+    head, rv = word[:match.end()], word[match.end():]
+    r2 = _region(word, _region(word))
+
+    rv, found = _cut(PERFECTIVE_GERUND, rv)
+    if not found:
+        rv, _ = _cut(REFLEXIVE, rv)
+        rv, found = _cut(ADJECTIVE, rv)
+        if found:
+            rv, _ = _cut(PARTICIPLE, rv)
+        else:
+            rv, found = _cut(VERB, rv)
+            if not found:
+                rv, _ = _cut(NOUN, rv)
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    match = DERIVATIONAL.search(rv)
+    if match and len(head) + match.start() >= r2:
+        rv = rv[:match.start()]
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, found = _cut(SUPERLATIVE, rv)
+        if found and rv.endswith('нн'):
+            rv = rv[:-1]
+        elif not found and rv.endswith('ь'):
+            rv = rv[:-1]
+    return head + rv
+
+
+def tokens(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word) for word in WORD.findall(text)]
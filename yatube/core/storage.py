@@ -0,0 +1,90 @@
+"""Файловое хранилище с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого, поэтому одинаковые картинки
+хранятся один раз, а миниатюры и варианты, которые строятся по имени
+файла, становятся общими для всех постов с этой картинкой. Ссылки на
+файл считаются в StoredFile: retain() при появлении ссылки, release()
+при её удалении. Файл без ссылок удаляется после коммита, если forget()
+подтвердит, что за это время такую же картинку не загрузили снова.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    @staticmethod
+    def digest(content):
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def content_name(name, digest):
+        """posts/photo.JPG -> posts/ab/ab12...ef.jpg"""
+        if os.path.splitext(os.path.basename(name))[0] == digest:
+            # Имя уже построено по этому содержимому.
+            return name
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.content_name(name, self.digest(content))
+        if self.exists(name):
+            if StoredFile.objects.filter(
+                name=name, references__gt=0
+            ).exists():
+                # Такое содержимое уже лежит под этим именем.
+                return name
+            # Файл без ссылок может ждать удаления после коммита:
+            # записываем его заново, а не полагаемся на него.
+            self.delete(name)
+        return super().save(name, content, max_length)
+
+
+def retain(name):
+    """Добавить ссылку на файл."""
+    if not StoredFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    ):
+        stored, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'references': 1}
+        )
+        if not created:
+            StoredFile.objects.filter(name=name).update(
+                references=F('references') + 1
+            )
+
+
+def release(name):
+    """Убрать ссылку на файл; True, если она была последней.
+
+    Строка с нулём ссылок остаётся до forget(). Для файлов без учёта
+    ссылок (загруженных до хранилища) вернёт False: их удаление остаётся
+    сборщику мусора.
+    """
+    StoredFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1
+    )
+    return StoredFile.objects.filter(name=name, references=0).exists()
+
+
+def forget(name):
+    """Перестать учитывать файл без ссылок; True, если его можно удалить.
+
+    Удаление условное: если одинаковая загрузка успела снова сослаться на
+    файл, строка и файл остаются.
+    """
+    return StoredFile.objects.filter(name=name, references=0).delete()[0] > 0
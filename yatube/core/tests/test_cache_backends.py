@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..cache_backends import SQLiteCache
+
+
+def _incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Запись одного экземпляра видна другому."""
+        self.cache.set('post', {'text': 'Текст'})
+        self.cache.set_many({'a': 1, 'b': [2]})
+        other = self.make_cache()
+        self.assertEqual(other.get('post'), {'text': 'Текст'})
+        self.assertEqual(
+            other.get_many(['a', 'b', 'missing']), {'a': 1, 'b': [2]}
+        )
+        other.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 5))
+        self.assertEqual(self.cache.incr('key', 10), 11)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        # Нецелые значения хранятся pickle и увеличиваются без UPDATE.
+        self.cache.set('ratio', 0.5, 10)
+        self.assertEqual(self.cache.incr('ratio'), 1.5)
+        self.assertEqual(self.cache.get('ratio'), 1.5)
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set('short', 'value', 10)
+        self.cache.set('forever', 'value', None)
+        with mock.patch('time.time', return_value=time.time() + 20):
+            self.assertIsNone(self.cache.get('short'))
+            self.assertFalse(self.cache.has_key('short'))
+            self.assertTrue(self.cache.add('short', 'new'))
+            self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_least_recently_used_are_culled(self):
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=4)
+        now = time.time()
+        for index in range(4):
+            with mock.patch('time.time', return_value=now + index):
+                cache.set(f'key{index}', index)
+        # Чтение освежает запись, и её вытеснят позже остальных.
+        with mock.patch('time.time', return_value=now + 100):
+            cache.get('key0')
+            cache.set('key4', 4)
+        self.assertEqual(
+            sorted(cache.get_many([f'key{i}' for i in range(5)])),
+            ['key0', 'key2', 'key3', 'key4'],
+        )
+
+    def test_expired_entries_are_culled_first(self):
+        """Если места хватает после удаления просроченных записей,
+        живые записи не вытесняются."""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_FREQUENCY=1)
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            cache.set('short', 'value', 10)
+            cache.set_many({'a': 1, 'b': 2})
+        with mock.patch('time.time', return_value=now + 20):
+            cache.set_many({'c': 3, 'd': 4})
+            self.assertEqual(
+                sorted(cache.get_many(['short', 'a', 'b', 'c', 'd'])),
+                ['a', 'b', 'c', 'd'],
+            )
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
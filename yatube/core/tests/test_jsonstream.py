@@ -0,0 +1,34 @@
+import io
+import json
+
+from django.test import SimpleTestCase
+
+from core.jsonstream import iter_array, iter_records
+
+
+class JsonStreamTest(SimpleTestCase):
+    data = [{'pk': i, 'text': 'т' * i} for i in range(30)] + [12345, [1]]
+
+    def test_array_is_read_in_chunks(self):
+        """Значения на границах кусков разбираются целиком."""
+        for chunk_size in (1, 4, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    list(iter_array(
+                        io.StringIO(json.dumps(self.data)), chunk_size
+                    )),
+                    self.data,
+                )
+
+    def test_format_is_detected(self):
+        lines = '\n'.join(json.dumps(item) for item in self.data)
+        for text in (f' \n{json.dumps(self.data)}', lines, '[]', ''):
+            with self.subTest(text=text[:10]):
+                expected = self.data if len(text) > 2 else []
+                self.assertEqual(
+                    list(iter_records(io.StringIO(text))), expected
+                )
+
+    def test_broken_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_array(io.StringIO('[{"pk": 1}, {"pk"'), 4))
@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase
+
+from core.fts import match_expression
+from core.stemmer import stem
+
+
+class StemmerTest(SimpleTestCase):
+    def test_stem(self):
+        """Словоформы сводятся к одной основе, как в Snowball."""
+        words = {
+            'котами': 'кот',
+            'красивая': 'красив',
+            'важнейшими': 'важн',
+            'важности': 'важност',
+            'одеваться': 'одева',
+            'ёжиками': 'ежик',
+            'Django': 'django',
+        }
+        for word, expected in words.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_match_expression_quotes_operators(self):
+        self.assertEqual(
+            match_expression('кошки NEAR "собаки*'), '"кошк" "near" "собак"'
+        )
+        self.assertEqual(match_expression(' !? '), '')
@@ -0,0 +1,214 @@
+"""Области кэша постов и ключи их фрагментов.
+
+Номер поколения области входит в ключ {% cache %} и карточки поста
+(posts.cards), поэтому правка поста сразу меняет ключи всех страниц, где
+он показан, а TTL фрагментов может быть долгим.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from core import generations
+
+from .models import Follow, Group, Post, User
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def user_scope(user_id):
+    """Имя пользователя, которое показывается рядом с его постами."""
+    return f'user:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    """Лента подписок пользователя: подписки и посты непопулярных авторов."""
+    return f'follow:{user_id}'
+
+
+def group_scope(group_id):
+    """Название и slug группы на страницах её постов."""
+    return f'group:{group_id}'
+
+
+def _post_column_key(column, post_id):
+    return f'post-{column}:{post_id}'
+
+
+def _post_columns(column, post_ids, empty=None):
+    """Значения столбца постов {pk поста: значение} одним get_many.
+
+    В базу идут только посты, которых ещё нет в кэше; несуществующих
+    постов в ответе нет. Пустое значение хранится как empty: None get_many
+    не отличает от промаха.
+    """
+    keys = {_post_column_key(column, pk): pk for pk in post_ids}
+    found = {
+        keys[key]: value
+        for key, value in cache.get_many(list(keys)).items()
+    }
+    missing = [pk for pk in keys.values() if pk not in found]
+    if missing:
+        fetched = {
+            pk: empty if value is None else value
+            for pk, value in Post.objects.filter(pk__in=missing).values_list(
+                'pk', column
+            )
+        }
+        cache.set_many(
+            {
+                _post_column_key(column, pk): value
+                for pk, value in fetched.items()
+            },
+            None,
+        )
+        found.update(fetched)
+    return {
+        pk: None if value == empty else value for pk, value in found.items()
+    }
+
+
+def post_authors(post_ids):
+    """Авторы постов {pk поста: pk автора}: автор у поста не меняется."""
+    return _post_columns('author_id', post_ids)
+
+
+def post_author(post_id):
+    """Автор поста без запроса к базе: автор у поста не меняется."""
+    return post_authors([post_id]).get(post_id)
+
+
+def forget_post_author(post_id):
+    cache.delete(_post_column_key('author_id', post_id))
+
+
+def post_groups(post_ids):
+    """Группы постов {pk поста: pk группы или None}.
+
+    Группа у поста меняется при правке, и запись сбрасывает
+    forget_post_group.
+    """
+    return _post_columns('group_id', post_ids, empty=0)
+
+
+def forget_post_group(post_id):
+    cache.delete(_post_column_key('group_id', post_id))
+
+
+def shown_post_scopes(post_ids):
+    """Области имён авторов и групп, которые показаны рядом с постами."""
+    authors = post_authors(post_ids)
+    groups = post_groups(list(authors))
+    return [
+        *[user_scope(pk) for pk in sorted(set(authors.values()))],
+        *[
+            group_scope(pk)
+            for pk in sorted(set(groups.values()) - {None})
+        ],
+    ]
+
+
+def post_scopes(post):
+    """Области, которые затрагивает изменение поста."""
+    return [author_scope(post.author_id), post_scope(post.pk)]
+
+
+def fragment_context(*scopes):
+    """Переменные шаблона для {% cache cache_timeout ... cache_version %}."""
+    return {
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': generations.version(*scopes),
+    }
+
+
+def follow_version(user_id, popular):
+    """Версия ленты подписок для ключа кэша.
+
+    Посты популярных авторов не раскладываются по лентам, поэтому вместо
+    области подписчика меняются области самих авторов.
+    """
+    return generations.version(
+        follow_scope(user_id), *[author_scope(pk) for pk in popular]
+    )
+
+
+def follow_page_key(user, version, cursor):
+    """Ключ состава страницы ленты подписок (pk постов и курсоры).
+
+    Кэш переживает очистку базы (flush, тесты), и pk пользователя может
+    достаться другому, поэтому в ключе есть и время регистрации.
+    """
+    cursor = hashlib.md5((cursor or '').encode()).hexdigest()
+    joined = user.date_joined.timestamp()
+    return f'follow-page:{user.pk}:{joined}:{version}:{cursor}'
+
+
+def bump_followers(author_id):
+    """Новая версия ленты у всех подписчиков автора."""
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    generations.bump(*[follow_scope(user_id) for user_id in followers])
+
+
+def post_pages(post, previous_group_id=None):
+    """Пути страниц, на которых показан пост."""
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:profile', args=[post.author.username]),
+        reverse('posts:post_detail', args=[post.pk]),
+    ]
+    group_ids = {post.group_id, previous_group_id} - {None}
+    for slug in Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    ):
+        paths.append(reverse('posts:group_list', args=[slug]))
+    return paths
+
+
+def group_pages(group, previous_slug):
+    """Пути страниц, где показаны название и slug группы.
+
+    Страницы её постов зависят от области группы. Slug есть ещё и в
+    постах лент API, поэтому при его смене сбрасываются и ленты авторов
+    группы.
+    """
+    paths = [reverse('posts:group_list', args=[group.slug])]
+    if previous_slug in (None, group.slug):
+        return paths
+    paths += [
+        reverse('posts:group_list', args=[previous_slug]),
+        reverse('posts:index'),
+    ]
+    for username in User.objects.filter(posts__group=group).distinct(
+    ).values_list('username', flat=True):
+        paths.append(reverse('posts:profile', args=[username]))
+    return paths
+
+
+def profile_page(user):
+    return reverse('posts:profile', args=[user.username])
+
+
+def author_pages(user, previous_username):
+    """Пути страниц со списками постов, где показано имя автора.
+
+    Страницы его постов зависят от области автора и отдельного purge не
+    требуют.
+    """
+    paths = [
+        reverse('posts:index'),
+        profile_page(user),
+        reverse('posts:profile', args=[previous_username]),
+    ]
+    for slug in Group.objects.filter(posts__author=user).distinct(
+    ).values_list('slug', flat=True):
+        paths.append(reverse('posts:group_list', args=[slug]))
+    return paths
@@ -0,0 +1,57 @@
+"""Готовый HTML карточек постов.
+
+Карточка (posts/includes/post.html) не зависит ни от ленты, ни от того,
+кто её смотрит, поэтому главная, группы, профили, подписки, теги и поиск
+показывают один и тот же закэшированный HTML. В ключе — поколения поста
+и его автора: правка поста, готовая миниатюра (thumbnails.prepare) или
+новое имя автора дают новый ключ.
+Страница собирается одним get_many, рендерятся только недостающие
+карточки, и они записываются одним set_many.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import generations
+
+from . import caching, thumbnails, variants
+
+TEMPLATE = 'posts/includes/post.html'
+
+
+def card_key(post_id, version):
+    return f'post-card:{post_id}:{version}'
+
+
+def card_scopes(post):
+    return caching.post_scope(post.pk), caching.user_scope(post.author_id)
+
+
+def attach(posts):
+    """Проставить постам страницы post.card — HTML карточки."""
+    posts = list(posts)
+    scopes = {post.pk: card_scopes(post) for post in posts}
+    found = generations.get_generations(
+        *{scope for pair in scopes.values() for scope in pair}
+    )
+    keys = {
+        post.pk: card_key(
+            post.pk, '.'.join(str(found[scope]) for scope in scopes[post.pk])
+        )
+        for post in posts
+    }
+    cards = cache.get_many(list(keys.values()))
+    missing = [post for post in posts if keys[post.pk] not in cards]
+    # Миниатюры и варианты нужны только карточкам, которых нет в кэше.
+    thumbnails.attach(missing)
+    variants.attach(missing)
+    rendered = {
+        keys[post.pk]: render_to_string(TEMPLATE, {'post': post})
+        for post in missing
+    }
+    if rendered:
+        cache.set_many(rendered, settings.FRAGMENT_CACHE_TIMEOUT)
+        cards.update(rendered)
+    for post in posts:
+        post.card = mark_safe(cards[keys[post.pk]])
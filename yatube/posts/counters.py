@@ -0,0 +1,127 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными UPDATE ... SET x = x + 1 из сигналов, а
+команда recount_counters пересчитывает их пачками и исправляет расхождения.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+CHUNK_SIZE = 1000
+
+
+def get_counters(user_id):
+    """Счётчики пользователя; недостающая строка создаётся с нулями."""
+    return UserCounters.objects.get_or_create(user_id=user_id)[0]
+
+
+def _add(queryset, field, delta):
+    """Сдвинуть счётчик, не опуская его ниже нуля. Вернёт число строк."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def add_to_user(user_id, field, delta):
+    queryset = UserCounters.objects.filter(user_id=user_id)
+    if _add(queryset, field, delta) or delta < 0:
+        return
+    if User.objects.filter(pk=user_id).exists():
+        get_counters(user_id)
+        _add(queryset, field, delta)
+
+
+def add_to_group(group_id, delta):
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def add_to_post(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _chunks(queryset):
+    """Первичные ключи выборки пачками по CHUNK_SIZE, без OFFSET."""
+    last = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last).order_by('pk').values_list(
+                'pk', flat=True
+            )[:CHUNK_SIZE]
+        )
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def _totals(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by().values_list(
+            field
+        ).annotate(total=Count('pk'))
+    )
+
+
+def recount_users():
+    """Пересчитать счётчики пользователей; вернуть число исправленных."""
+    fixed = 0
+    for ids in _chunks(User.objects.all()):
+        posts = _totals(Post.objects.all(), 'author', ids)
+        followers = _totals(Follow.objects.all(), 'author', ids)
+        following = _totals(Follow.objects.all(), 'user', ids)
+        existing = UserCounters.objects.in_bulk(ids)
+        changed, missing = [], []
+        for user_id in ids:
+            actual = {
+                'posts_count': posts.get(user_id, 0),
+                'followers_count': followers.get(user_id, 0),
+                'following_count': following.get(user_id, 0),
+            }
+            counters = existing.get(user_id)
+            if counters is None:
+                missing.append(UserCounters(user_id=user_id, **actual))
+                continue
+            if any(getattr(counters, k) != v for k, v in actual.items()):
+                for field, value in actual.items():
+                    setattr(counters, field, value)
+                changed.append(counters)
+        UserCounters.objects.bulk_create(missing)
+        UserCounters.objects.bulk_update(
+            changed, ['posts_count', 'followers_count', 'following_count']
+        )
+        fixed += len(changed) + len(missing)
+    return fixed
+
+
+def recount_groups():
+    """Пересчитать число постов в группах; вернуть число исправленных."""
+    fixed = 0
+    for ids in _chunks(Group.objects.all()):
+        posts = _totals(Post.objects.all(), 'group', ids)
+        changed = []
+        for group in Group.objects.filter(pk__in=ids).only('posts_count'):
+            if group.posts_count != posts.get(group.pk, 0):
+                group.posts_count = posts.get(group.pk, 0)
+                changed.append(group)
+        Group.objects.bulk_update(changed, ['posts_count'])
+        fixed += len(changed)
+    return fixed
+
+
+def recount_posts():
+    """Пересчитать число комментариев у постов; вернуть число исправленных."""
+    fixed = 0
+    for ids in _chunks(Post.objects.all()):
+        comments = _totals(Comment.objects.all(), 'post', ids)
+        changed = []
+        for post in Post.objects.filter(pk__in=ids).only('comments_count'):
+            if post.comments_count != comments.get(post.pk, 0):
+                post.comments_count = comments.get(post.pk, 0)
+                changed.append(post)
+        Post.objects.bulk_update(changed, ['comments_count'])
+        fixed += len(changed)
+    return fixed
@@ -1,7 +1,11 @@
 from xml.etree.ElementTree import Comment
+from django.core.files.uploadedfile import UploadedFile
+from django import forms
 from django.forms import ModelForm
 
-from .models import Post, Comment
+from core.images import normalize
+
+from .models import Group, Post, Comment
 
 
 class PostForm(ModelForm):
@@ -9,6 +13,13 @@ class PostForm(ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['group'].empty_label = 'Группа не выбрана'
 
+    def clean_image(self):
+        """Новая картинка уменьшается и перекодируется до сохранения."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return normalize(image)
+        return image
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
@@ -18,3 +29,15 @@ class CommentForm(ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Запрос', max_length=200)
+    group = forms.ModelChoiceField(
+        label='Группа',
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        empty_label='Все группы',
+        required=False,
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
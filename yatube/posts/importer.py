@@ -0,0 +1,122 @@
+"""Потоковая загрузка дампов (формат dumpdata, JSON или JSONL).
+
+В отличие от loaddata файл не читается целиком, объекты вставляются
+bulk_create пачками, а сигналы не вызываются. Модели загружаются в
+порядке зависимостей по внешним ключам: для каждой модели файл читается
+заново, поэтому в памяти не бывает больше одной пачки. Связи многие ко
+многим (группы и права пользователей) вставляются в промежуточные таблицы
+вслед за своей пачкой; права, как и в loaddata, ищутся по pk или по
+естественным ключам, если дамп снят с --natural-foreign.
+Учёт ссылок на файлы и размеры картинок, которые иначе проставляют
+сигналы, восстанавливает restore_images().
+"""
+import time
+
+from django.apps import apps
+from django.core.serializers.python import Deserializer
+
+from core.jsonstream import iter_records
+from core.models import explicit_created
+
+from . import thumbnails
+from .media_gc import recount_references
+from .models import Comment, Post
+
+# Каждая модель ссылается только на модели левее неё.
+MODELS = (
+    'posts.group',
+    'auth.group',
+    'auth.user',
+    'posts.post',
+    'posts.comment',
+    'posts.follow',
+)
+BATCH_SIZE = 1000
+
+
+class Importer:
+    def __init__(
+        self, path, batch_size=BATCH_SIZE, ignore_conflicts=False,
+        models=MODELS,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.models = [apps.get_model(label) for label in models]
+
+    def records(self, label):
+        with open(self.path, encoding='utf-8') as file:
+            for record in iter_records(file):
+                if record.get('model') == label:
+                    yield record
+
+    def load(self, model):
+        """Загрузить строки одной модели; вернуть их число."""
+        label = model._meta.label_lower
+        total = 0
+        batch = []
+        # Deserializer разбирает поля так же, как loaddata, но без запросов.
+        for item in Deserializer(
+            self.records(label), ignorenonexistent=True
+        ):
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                total += self.flush(model, batch)
+                batch = []
+        return total + self.flush(model, batch)
+
+    def flush(self, model, batch):
+        if batch:
+            model.objects.bulk_create(
+                [item.object for item in batch],
+                ignore_conflicts=self.ignore_conflicts,
+            )
+            for field in model._meta.many_to_many:
+                self.flush_m2m(field, batch)
+        return len(batch)
+
+    def flush_m2m(self, field, batch):
+        """Строки промежуточной таблицы для связей пачки."""
+        through = field.remote_field.through
+        source = f'{field.m2m_field_name()}_id'
+        target = f'{field.m2m_reverse_field_name()}_id'
+        rows = [
+            through(**{source: item.object.pk, target: pk})
+            for item in batch
+            for pk in item.m2m_data.get(field.name, ())
+        ]
+        through.objects.bulk_create(
+            rows, batch_size=self.batch_size,
+            ignore_conflicts=self.ignore_conflicts,
+        )
+
+    def run(self):
+        """Загрузить все модели; выдаёт (модель, строк, секунд)."""
+        with explicit_created(Post, Comment):
+            for model in self.models:
+                started = time.perf_counter()
+                rows = self.load(model)
+                yield model, rows, time.perf_counter() - started
+
+
+def restore_images(batch_size=BATCH_SIZE):
+    """Пересчитать ссылки на файлы и проставить размеры картинкам.
+
+    Вернёт число постов, которым проставлены размеры.
+    """
+    recount_references()
+    posts = Post.objects.exclude(image='').filter(
+        image_width__isnull=True
+    ).only('pk', 'image').order_by('pk')
+    last = filled = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return filled
+        for post in batch:
+            post.image_width, post.image_height = (
+                thumbnails.image_dimensions(post.image)
+            )
+            filled += post.image_width is not None
+        Post.objects.bulk_update(batch, ['image_width', 'image_height'])
+        last = batch[-1].pk
@@ -0,0 +1,94 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import explicit_created
+from core.paginator import NEXT, CursorPaginator, encode_cursor
+from posts.models import Post
+from posts.views import NUMBER_OF_POSTS
+
+User = get_user_model()
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает OFFSET- и keyset-пагинацию ленты на первой и глубокой '
+        'странице. Данные создаются во временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, page = options['rows'], options['page']
+        repeat = options['repeat']
+        if (page - 1) * NUMBER_OF_POSTS >= rows:
+            page = rows // NUMBER_OF_POSTS
+        page = max(page, 2)
+        with transaction.atomic():
+            self.fill(rows)
+            queryset = Post.objects.all()
+            boundary = queryset.order_by('-created', '-id').values_list(
+                'created', 'id'
+            )[(page - 1) * NUMBER_OF_POSTS - 1]
+            deep_cursor = encode_cursor(NEXT, page, boundary)
+
+            def cursor_page(cursor):
+                return lambda: list(
+                    CursorPaginator(queryset, NUMBER_OF_POSTS).get_page(cursor)
+                )
+
+            def offset_page(number):
+                return lambda: list(
+                    Paginator(
+                        queryset.order_by('-created', '-id'), NUMBER_OF_POSTS
+                    ).page(number)
+                )
+
+            results = [
+                ('cursor', 1, cursor_page(None)),
+                ('cursor', page, cursor_page(deep_cursor)),
+                ('offset', 1, offset_page(1)),
+                ('offset', page, offset_page(page)),
+            ]
+            self.stdout.write(f'{rows} постов, {repeat} повторов, медиана:')
+            for name, number, func in results:
+                median = self.measure(func, repeat)
+                self.stdout.write(
+                    f'  {name:<6} страница {number:>7}: {median:8.2f} мс'
+                )
+            transaction.set_rollback(True)
+
+    def fill(self, rows):
+        author = User.objects.create_user(username='bench_pagination')
+        start = timezone.now() - timedelta(seconds=rows)
+        with explicit_created(Post):
+            for offset in range(0, rows, BATCH_SIZE):
+                Post.objects.bulk_create(
+                    Post(
+                        author=author,
+                        text=f'Пост {i}',
+                        created=start + timedelta(seconds=i),
+                    )
+                    for i in range(offset, min(offset + BATCH_SIZE, rows))
+                )
+
+    @staticmethod
+    def measure(func, repeat):
+        func()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
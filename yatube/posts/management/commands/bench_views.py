@@ -0,0 +1,225 @@
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+
+from core.loadtest import Driver, peak_memory, session_cookie, summary
+from posts import synthetic
+from posts.models import Comment, Follow, Group, Post, PostTag
+from posts.urls import urlpatterns
+
+User = get_user_model()
+
+# GET этих адресов меняет данные.
+WRITES = {'profile_follow', 'profile_unfollow'}
+# Этим видам нужен вошедший пользователь.
+AUTHORIZED = {
+    'post_create', 'post_edit', 'add_comment', 'mentions', 'follow_index',
+}
+# А этим — вошедший сотрудник: обычного пользователя они перенаправляют.
+STAFF = {'export'}
+QUERIES = {'search': urlencode({'q': synthetic.WORDS[0]})}
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все страницы posts через WSGI-приложение в этом же '
+        'процессе с заданной параллельностью и сообщает p50/p95/p99 '
+        'времени ответа и число SQL-запросов по каждой странице, а также '
+        'пиковый RSS за весь прогон. Результат можно сохранить в JSON и '
+        'сравнить с прошлым.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на страницу.',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--user',
+            help='Вошедший пользователь; по умолчанию — с наибольшим '
+                 'числом подписок.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--views', nargs='+', help='Только эти страницы (имена URL).'
+        )
+        parser.add_argument('--output', help='Сохранить результат в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        user = self.user(options['user'])
+        staff = User.objects.filter(
+            is_staff=True, is_active=True
+        ).order_by('pk').first()
+        targets = self.targets(user, staff, options['views'])
+        driver = Driver()
+        cookies = {None: None, user: session_cookie(user)}
+        if staff is not None:
+            cookies[staff] = session_cookie(staff)
+        results = {}
+        for name, path, query, visitor in targets:
+            results[name] = self.run(
+                driver, path, query, cookies[visitor], options
+            )
+            self.report(name, results[name])
+        # ru_maxrss — максимум за жизнь процесса, а не за одну страницу.
+        peak_rss = peak_memory()
+        self.stdout.write(f'Пиковый RSS: {peak_rss:.0f} МБ')
+        report = {
+            'created': timezone.now().isoformat(),
+            'commit': self.commit(),
+            'options': {
+                key: options[key]
+                for key in ('requests', 'concurrency', 'cold')
+            },
+            'dataset': {
+                model._meta.label: model.objects.count()
+                for model in (User, Group, Post, Comment, Follow)
+            },
+            'peak_rss_mb': peak_rss,
+            'views': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    @staticmethod
+    def user(username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {username}.')
+        user = User.objects.order_by(
+            '-counters__following_count', 'pk'
+        ).first()
+        if user is None:
+            raise CommandError('В базе нет пользователей: generate_data.')
+        return user
+
+    @staticmethod
+    def samples(user):
+        """Значения параметров URL: самые нагруженные объекты набора."""
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        group = Group.objects.order_by('-posts_count', 'pk').first()
+        author = Post.objects.values_list(
+            'author__username', flat=True
+        ).first()
+        tag = PostTag.objects.order_by().values('tag').annotate(
+            total=Count('pk')
+        ).order_by('-total').values_list('tag', flat=True).first()
+        return {
+            'post_id': post and post.pk,
+            'slug': group and group.slug,
+            'username': author or user.username,
+            'tag': tag or synthetic.TAGS[0],
+            'table': 'follows',
+        }
+
+    def targets(self, user, staff, names):
+        samples = self.samples(user)
+        targets = []
+        for pattern in urlpatterns:
+            name = pattern.name
+            if name in WRITES or (names and name not in names):
+                continue
+            kwargs = {
+                key: samples[key] for key in pattern.pattern.converters
+            }
+            if None in kwargs.values():
+                self.stdout.write(f'{name}: нет данных, пропущено')
+                continue
+            visitor = None
+            if name in STAFF:
+                visitor = staff
+                if staff is None:
+                    self.stdout.write(f'{name}: нет сотрудника, пропущено')
+                    continue
+            elif name in AUTHORIZED:
+                visitor = user
+            targets.append((
+                name,
+                reverse(f'posts:{name}', kwargs=kwargs),
+                QUERIES.get(name, ''),
+                visitor,
+            ))
+        return targets
+
+    @staticmethod
+    def run(driver, path, query, cookie, options):
+        def call(_):
+            if options['cold']:
+                cache.clear()
+            return driver.request('GET', path, query, cookie)
+
+        # Первый запрос прогревает шаблоны и не учитывается.
+        driver.request('GET', path, query, cookie)
+        concurrency = options['concurrency']
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                responses = list(pool.map(call, range(options['requests'])))
+        else:
+            responses = list(map(call, range(options['requests'])))
+        statuses = {}
+        for status, _, _ in responses:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        queries = sorted(queries for _, _, queries in responses)
+        return {
+            'path': path + ('?' + query if query else ''),
+            'statuses': statuses,
+            'latency_ms': summary([elapsed for _, elapsed, _ in responses]),
+            'queries': {'min': queries[0], 'max': queries[-1]},
+        }
+
+    def report(self, name, result):
+        latency = result['latency_ms']
+        statuses = ' '.join(
+            f'{status}×{count}'
+            for status, count in result['statuses'].items()
+        )
+        self.stdout.write(
+            f'{name:<14} p50 {latency["p50"]:7.2f} '
+            f'p95 {latency["p95"]:7.2f} p99 {latency["p99"]:7.2f} мс, '
+            f'запросов {result["queries"]["max"]:>3}, {statuses}'
+        )
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)['views']
+        self.stdout.write(f'Сравнение p95 с {path}:')
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]['latency_ms']['p95']
+            after = result['latency_ms']['p95']
+            change = f'{after / before - 1:+.0%}' if before else 'n/a'
+            self.stdout.write(
+                f'  {name:<14} {before:7.2f} -> {after:7.2f} мс ({change})'
+            )
+
+    @staticmethod
+    def commit():
+        """Текущий коммит, чтобы результаты разных запусков различались."""
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from posts.media_gc import Collector
+
+KINDS = {
+    'originals': 'Оригиналов',
+    'thumbnails': 'Миниатюр',
+    'variants': 'Вариантов',
+    'keys': 'Записей sorl',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT картинки, на которые не ссылается ни один '
+        'пост, их миниатюры и варианты, а также устаревшие записи '
+        'хранилища ключей sorl.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, что и сколько места освободится.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Пауза в секундах между пачками, чтобы не нагружать диск.',
+        )
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Не трогать файлы моложе указанного числа часов.',
+        )
+
+    def handle(self, *args, **options):
+        stats = Collector(
+            min_age=options['min_age'] * 60 * 60,
+            sleep=options['sleep'],
+            dry_run=options['dry_run'],
+        ).collect()
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        for kind, title in KINDS.items():
+            files, size = stats.get(kind, (0, 0))
+            line = f'{verb}. {title}: {files}'
+            if kind != 'keys':
+                line += f', {size / 2 ** 20:.1f} МБ'
+            self.stdout.write(line)
@@ -0,0 +1,85 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core import generations, pagecache
+from posts import caching, variants
+from posts.media_gc import recount_references
+from posts.models import ImageVariant, Post
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с адресацией по содержимому: '
+        'одинаковые файлы схлопываются в один, ссылки постов обновляются, '
+        'а счётчики ссылок пересчитываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько места освободится.',
+        )
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        dry_run = options['dry_run']
+        moved = merged = missing = freed = 0
+        for name in self.names():
+            if not self.storage.exists(name):
+                missing += 1
+                continue
+            with self.storage.open(name) as file:
+                target = self.storage.content_name(
+                    name, self.storage.digest(file)
+                )
+            if target == name:
+                continue
+            duplicate = self.storage.exists(target)
+            if duplicate:
+                merged += 1
+                freed += self.storage.size(name)
+            else:
+                moved += 1
+            if not dry_run:
+                self.relink(name, target, duplicate)
+        if not dry_run:
+            recount_references()
+        self.stdout.write(
+            f'Перенесено: {moved}, дубликатов: {merged}, '
+            f'освобождено: {freed / 2 ** 20:.1f} МБ, '
+            f'нет на диске: {missing}'
+        )
+
+    @staticmethod
+    def names():
+        """Различные имена картинок пачками, без OFFSET."""
+        last = ''
+        images = Post.objects.exclude(image='').order_by('image').values_list(
+            'image', flat=True
+        ).distinct()
+        while True:
+            names = list(images.filter(image__gt=last)[:BATCH_SIZE])
+            if not names:
+                return
+            yield from names
+            last = names[-1]
+
+    def relink(self, name, target, duplicate):
+        if duplicate:
+            self.storage.delete(name)
+            variants.delete(name)
+        else:
+            os.makedirs(
+                os.path.dirname(self.storage.path(target)), exist_ok=True
+            )
+            os.replace(self.storage.path(name), self.storage.path(target))
+            ImageVariant.objects.filter(image=name).update(image=target)
+        posts = Post.objects.filter(image=name)
+        # update() минует сигналы, поэтому кэш страниц сбрасывается здесь.
+        for post in posts.select_related('author'):
+            generations.bump(*caching.post_scopes(post))
+            pagecache.purge(*caching.post_pages(post))
+        posts.update(image=target)
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии или подписки в JSONL (формат '
+        'dumpdata) или CSV, при необходимости сжимая gzip. Строки читаются '
+        'пачками, память не зависит от размера таблицы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(export.TABLES))
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='jsonl'
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip.'
+        )
+        parser.add_argument(
+            '--since',
+            help='Только записи, созданные с этого момента (ISO 8601).',
+        )
+        parser.add_argument(
+            '--output', help='Файл выгрузки, по умолчанию stdout.'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since: ожидается дата в ISO 8601.')
+        try:
+            chunks = export.stream(
+                options['table'], options['format'], since, options['gzip']
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        if options['output']:
+            with open(options['output'], 'wb') as file:
+                file.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import synthetic
+from posts.importer import BATCH_SIZE
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический набор данных: пользователей, группы, посты '
+        '(часть с картинками), комментарии и подписки со степенным '
+        'распределением популярности авторов. Записи генерируются в '
+        'нескольких процессах и загружаются через import_dump.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.1,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.0,
+            help='Показатель степенного закона популярности авторов.',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов-генераторов.',
+        )
+        parser.add_argument('--batch', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--output',
+            help='Сохранить дамп в файл, чтобы загрузить его снова.',
+        )
+
+    def handle(self, *args, **options):
+        plan = self.plan(options)
+        started = time.perf_counter()
+        path = options['output']
+        if path is None:
+            file = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False)
+            file.close()
+            path = file.name
+        try:
+            with open(path, 'w', encoding='utf-8') as file:
+                for lines in self.generate(plan, options['workers']):
+                    file.writelines(lines)
+            self.stdout.write(
+                f'Сгенерировано за {time.perf_counter() - started:.2f} с'
+            )
+            call_command(
+                'import_dump', path, batch=options['batch'],
+                stdout=self.stdout,
+            )
+        finally:
+            if options['output'] is None:
+                os.remove(path)
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - started:.2f} с'
+        )
+
+    @staticmethod
+    def plan(options):
+        """Параметры генерации; номера записей — после уже существующих."""
+        now = timezone.now()
+        span = timedelta(days=options['days'])
+        return {
+            'users': options['users'],
+            'groups': options['groups'],
+            'posts': options['posts'],
+            'comments': options['comments'],
+            'follows': options['follows'],
+            'images': options['images'],
+            'alpha': options['alpha'],
+            'seed': options['seed'],
+            'start': now - span,
+            'span': span,
+            'base': {
+                name: (
+                    model.objects.aggregate(last=Max('pk'))['last'] or 0
+                ) + 1
+                for name, model in (
+                    ('user', User),
+                    ('group', Group),
+                    ('post', Post),
+                    ('comment', Comment),
+                )
+            },
+        }
+
+    @staticmethod
+    def generate(plan, workers):
+        tasks = synthetic.tasks(plan)
+        if workers <= 1:
+            synthetic.init(plan)
+            yield from map(synthetic.generate, tasks)
+            return
+        # Процессы наследуют соединение с базой при fork; им оно не нужно.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(
+            workers, initializer=synthetic.init, initargs=(plan,)
+        ) as pool:
+            yield from pool.imap_unordered(synthetic.generate, tasks)
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.cache_backends import is_shared
+from posts import thumbnails
+from posts.models import Post
+
+CHUNK_SIZE = 100
+
+
+def _generate_chunk(chunk):
+    ready = built = 0
+    for pk, name, width in chunk:
+        thumbnail_ready, variants_built = thumbnails.prepare(name)
+        ready += thumbnail_ready
+        built += variants_built
+        if width is None:
+            post = Post.objects.only('image').get(pk=pk)
+            width, height = thumbnails.image_dimensions(post.image)
+            Post.objects.filter(pk=pk).update(
+                image_width=width, image_height=height
+            )
+    return chunk[-1][0], ready, built
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры и адаптивные варианты картинок уже опубликованных '
+        'постов пулом процессов и заполняет размеры картинок. Прогресс '
+        'сохраняется, и прерванный запуск продолжается с того же места.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Число процессов, по умолчанию по числу ядер.',
+        )
+        parser.add_argument(
+            '--state',
+            default=os.path.join(settings.BASE_DIR, '.thumbnails_progress'),
+            help='Файл с последним обработанным постом.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с первого поста, не глядя на сохранённый прогресс.',
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            raise CommandError(thumbnails.SHARED_CACHE_REQUIRED)
+        state = options['state']
+        last = 0 if options['restart'] else self.read_state(state)
+        if last:
+            self.stdout.write(f'Продолжаем после поста {last}')
+        # Дочерние процессы не должны делить соединение родителя.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        ready = built = 0
+        with context.Pool(options['processes']) as pool:
+            # imap сохраняет порядок пачек, поэтому записанный прогресс
+            # означает, что все посты до него обработаны.
+            for last, chunk_ready, chunk_built in pool.imap(
+                _generate_chunk, self.chunks(last)
+            ):
+                ready += chunk_ready
+                built += chunk_built
+                with open(state, 'w') as file:
+                    file.write(str(last))
+        self.stdout.write(
+            f'Готово миниатюр: {ready}, адаптивных вариантов: {built}'
+        )
+        if os.path.exists(state):
+            os.remove(state)
+
+    @staticmethod
+    def read_state(path):
+        try:
+            with open(path) as file:
+                return int(file.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def chunks(last):
+        """Посты с картинками пачками по первичному ключу, без OFFSET."""
+        posts = Post.objects.exclude(image='').order_by('pk')
+        while True:
+            chunk = list(
+                posts.filter(pk__gt=last).values_list(
+                    'pk', 'image', 'image_width'
+                )[:CHUNK_SIZE]
+            )
+            if not chunk:
+                return
+            yield chunk
+            last = chunk[-1][0]
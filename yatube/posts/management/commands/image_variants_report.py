@@ -0,0 +1,108 @@
+import io
+import json
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageOps
+
+from posts import thumbnails, variants
+from posts.views import NUMBER_OF_POSTS
+
+
+def _thumbnail_size(image):
+    """Байты прежней миниатюры 960x339 с полями (JPEG, как у sorl)."""
+    width, height = map(int, thumbnails.GEOMETRY.split('x'))
+    padded = ImageOps.pad(
+        image.convert('RGB'), (width, height), color='#ffffff'
+    )
+    buffer = io.BytesIO()
+    padded.save(buffer, format='JPEG', quality=95)
+    return len(buffer.getvalue())
+
+
+def _choose(rendered, needed):
+    """Вариант, который браузер выберет по srcset для нужной ширины."""
+    preferred = variants.formats()[0]
+    candidates = sorted(
+        (variant for variant, _ in rendered if variant.format == preferred),
+        key=lambda variant: variant.width,
+    )
+    for variant in candidates:
+        if variant.width >= needed:
+            return variant
+    return candidates[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает, сколько байт на страницу ленты экономят адаптивные '
+        'варианты картинок по сравнению с миниатюрой 960x339 на постах '
+        'из фикстуры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixture', default=os.path.join(settings.BASE_DIR, 'dump.json')
+        )
+        parser.add_argument(
+            '--viewports', type=int, nargs='+', default=[360, 768, 1280],
+            help='Ширины экранов в CSS-пикселях.',
+        )
+        parser.add_argument(
+            '--dpr', type=float, default=1.0,
+            help='Плотность пикселей экрана.',
+        )
+
+    def handle(self, *args, **options):
+        with open(options['fixture']) as file:
+            records = json.load(file)
+        posts = sorted(
+            (
+                record['fields'] for record in records
+                if record['model'] == 'posts.post'
+            ),
+            key=lambda fields: fields['created'],
+            reverse=True,
+        )
+        viewports, dpr = options['viewports'], options['dpr']
+        widest = max(settings.IMAGE_VARIANT_WIDTHS)
+        self.stdout.write(
+            'Форматы вариантов: ' + ', '.join(variants.formats())
+        )
+        header = [f'{"страница":>10}', f'{"миниатюры":>10}']
+        header += [f'{viewport:>10}px' for viewport in viewports]
+        self.stdout.write(' | '.join(header))
+        totals = [0] * (len(viewports) + 1)
+        missing = 0
+        for start in range(0, len(posts), NUMBER_OF_POSTS):
+            row = [0] * (len(viewports) + 1)
+            for fields in posts[start:start + NUMBER_OF_POSTS]:
+                name = fields.get('image')
+                if not name:
+                    continue
+                if not default_storage.exists(name):
+                    missing += 1
+                    continue
+                with default_storage.open(name) as file:
+                    image = Image.open(file)
+                    image.load()
+                rendered = variants.render(image)
+                row[0] += _thumbnail_size(image)
+                for index, viewport in enumerate(viewports, 1):
+                    needed = min(viewport, widest) * dpr
+                    row[index] += _choose(rendered, needed).size
+            totals = [total + value for total, value in zip(totals, row)]
+            self.write_row(start // NUMBER_OF_POSTS + 1, row)
+        self.write_row('всего', totals)
+        if missing:
+            self.stdout.write(f'Картинок нет в MEDIA_ROOT: {missing}')
+
+    def write_row(self, title, row):
+        baseline = row[0]
+        cells = [f'{title:>10}', f'{baseline / 1024:>8.1f}KB']
+        for value in row[1:]:
+            saved = 1 - value / baseline if baseline else 0
+            cells.append(f'{value / 1024:>6.1f}KB {saved:>4.0%}')
+        self.stdout.write(' | '.join(cells))
@@ -0,0 +1,105 @@
+import time
+from contextlib import nullcontext
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import (
+    IntegrityError, NotSupportedError, connection, transaction
+)
+
+from core.indexes import without_indexes
+from core.loadtest import peak_memory
+from posts.importer import BATCH_SIZE, Importer, restore_images
+
+# Данные, которые при обычной записи поддерживают сигналы.
+DERIVED = (
+    'recount_counters',
+    'rebuild_timeline',
+    'rebuild_search_index',
+    'index_tags',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, пользователей с их группами и правами, посты, '
+        'комментарии и подписки из дампа dumpdata (JSON или JSONL), не '
+        'читая файл целиком: пачками bulk_create, в порядке внешних ключей, '
+        'в одной транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл дампа, .json или .jsonl.')
+        parser.add_argument(
+            '--batch', type=int, default=BATCH_SIZE,
+            help='Число строк в одном bulk_create.',
+        )
+        parser.add_argument(
+            '--no-signals', action='store_true',
+            help=(
+                'Не пересчитывать после загрузки счётчики, ленты, поисковый '
+                'индекс и хештеги, которые иначе поддерживают сигналы.'
+            ),
+        )
+        parser.add_argument(
+            '--drop-indexes', action='store_true',
+            help='Удалить неуникальные индексы на время загрузки (SQLite).',
+        )
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки, которые уже есть в базе.',
+        )
+
+    def handle(self, *args, **options):
+        importer = Importer(
+            options['path'],
+            batch_size=options['batch'],
+            ignore_conflicts=options['ignore_conflicts'],
+        )
+        started = time.perf_counter()
+        total = 0
+        try:
+            with transaction.atomic():
+                indexes = nullcontext()
+                if options['drop_indexes']:
+                    indexes = without_indexes(*importer.models)
+                with indexes:
+                    for model, rows, seconds in importer.run():
+                        total += rows
+                        self.stdout.write(
+                            f'{model._meta.label}: {rows} строк за '
+                            f'{seconds:.2f} с '
+                            f'({rows / max(seconds, 1e-9):.0f} строк/с)'
+                        )
+                self.reset_sequences(importer.models)
+        except IntegrityError as error:
+            raise CommandError(
+                f'Строка нарушает ограничение базы ({error}). Строки, '
+                f'которые уже есть в базе, пропускает --ignore-conflicts.'
+            )
+        except (NotSupportedError, OSError, ValueError) as error:
+            raise CommandError(error)
+        loaded = time.perf_counter() - started
+        self.stdout.write(
+            f'Всего: {total} строк за {loaded:.2f} с '
+            f'({total / max(loaded, 1e-9):.0f} строк/с)'
+        )
+        # Без учёта ссылок файлы картинок не удалялись бы вместе с постами.
+        self.stdout.write(
+            f'Размеры картинок: {restore_images(options["batch"])}'
+        )
+        if not options['no_signals']:
+            for name in DERIVED:
+                call_command(name, stdout=self.stdout)
+            self.stdout.write(
+                f'С пересчётом: {time.perf_counter() - started:.2f} с'
+            )
+        self.stdout.write(f'Пик памяти: {peak_memory():.0f} МБ')
+
+    @staticmethod
+    def reset_sequences(models):
+        """Автоинкремент продолжается после загруженных явных pk."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет хештеги и упоминания для уже опубликованных постов и '
+        'комментариев. Посты читаются пачками по ключу, без OFFSET.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch', type=int, default=tags.BATCH_SIZE,
+            help='Число постов в пачке.',
+        )
+
+    def handle(self, *args, **options):
+        ids = Post.objects.order_by('id').values_list('id', flat=True)
+        last = total = 0
+        while True:
+            batch = list(ids.filter(id__gt=last)[:options['batch']])
+            if not batch:
+                break
+            with transaction.atomic():
+                total += tags.reindex(batch)
+            last = batch[-1]
+            self.stdout.write(f'Обработано постов: {total}')
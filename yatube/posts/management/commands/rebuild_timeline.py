@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает материализованные ленты подписок, например после '
+        'loaddata, который не вызывает раскладку постов по лентам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, help='Пересобрать ленту одного пользователя.'
+        )
+
+    # Одна транзакция вместо фиксации каждой пачки: в SQLite это fsync.
+    @transaction.atomic
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by('user_id', 'author_id')
+        entries = TimelineEntry.objects.all()
+        if options['user']:
+            follows = follows.filter(user_id=options['user'])
+            entries = entries.filter(user_id=options['user'])
+        entries.delete()
+        count = 0
+        for user_id, author_id in follows.values_list(
+            'user_id', 'author_id'
+        ).iterator():
+            timeline.backfill(user_id, author_id)
+            count += 1
+        self.stdout.write(f'Обработано подписок: {count}')
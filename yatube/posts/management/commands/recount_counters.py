@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, комментариев и '
+        'подписок пачками и исправляет расхождения.'
+    )
+
+    def handle(self, *args, **options):
+        for name, recount in (
+            ('пользователей', counters.recount_users),
+            ('групп', counters.recount_groups),
+            ('постов', counters.recount_posts),
+        ):
+            self.stdout.write(f'Исправлено {name}: {recount()}')
@@ -0,0 +1,234 @@
+import json
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+from django.utils.dateparse import parse_datetime
+
+from core.jsonstream import iter_lines
+from core.loadtest import Driver, session_cookie, summary
+from posts import synthetic
+
+User = get_user_model()
+
+# Запросы с телом (формы, CSRF) повторить по журналу нельзя.
+METHODS = ('GET', 'HEAD')
+
+
+class Command(BaseCommand):
+    help = (
+        'Повторяет запросы из журнала JSONL через WSGI-приложение в этом же '
+        'процессе — с исходными интервалами между запросами или в N раз '
+        'быстрее. Строка журнала: {"time": ISO 8601 или секунды, "method", '
+        '"path", "query", "user", "duration": мс}. Вошедшие пользователи '
+        'заменяются синтетическими (generate_data). Сообщает перцентили '
+        'времени ответа, долю ошибок и самые медленные страницы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Журнал запросов, JSONL.')
+        parser.add_argument(
+            '--speed', type=float, default=1.0,
+            help='Во сколько раз быстрее журнала; 0 — без пауз.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Наибольшее число одновременных запросов.',
+        )
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько самых медленных страниц показать.',
+        )
+        parser.add_argument('--output', help='Сохранить результат в JSON.')
+
+    def handle(self, *args, **options):
+        self.driver = Driver()
+        self.accounts = self.synthetic_accounts()
+        self.cookies = {}
+        self.results = {}
+        self.skipped = 0
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                self.replay(
+                    iter_lines(file), options['speed'], options['concurrency']
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        report = self.report(time.perf_counter() - started, options['top'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def synthetic_accounts():
+        """Номера учётных записей, на которые отображаются пользователи."""
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        accounts = list(users.filter(
+            username__startswith=synthetic.USERNAME.format('')
+        ))
+        return accounts or list(users)
+
+    def replay(self, entries, speed, concurrency):
+        """Отправлять запросы в моменты из журнала, делённые на speed.
+
+        Медленный ответ не задерживает следующие запросы: их ведут
+        concurrency потоков, а семафор не даёт очереди расти без предела.
+        Ответы собираются в этом потоке, поэтому исключение запроса не
+        теряется в пуле, а прерывает повтор.
+        """
+        slots = threading.BoundedSemaphore(concurrency)
+        pending = deque()
+        first = None
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for entry in entries:
+                method = entry.get('method', 'GET').upper()
+                path = entry.get('path')
+                if method not in METHODS or not path:
+                    self.skipped += 1
+                    continue
+                at = self.timestamp(entry.get('time'))
+                if speed and at is not None:
+                    if first is None:
+                        first = at
+                    delay = (at - first) / speed - (
+                        time.perf_counter() - started
+                    )
+                    if delay > 0:
+                        time.sleep(delay)
+                args = (
+                    method,
+                    path,
+                    (entry.get('query') or '').lstrip('?'),
+                    self.cookie(entry.get('user')),
+                )
+                endpoint = self.endpoint(path)
+                recorded = entry.get('duration')
+                if concurrency <= 1:
+                    response = self.driver.request(*args)
+                    self.collect(endpoint, recorded, response)
+                    continue
+                slots.acquire()
+                future = pool.submit(self.driver.request, *args)
+                future.add_done_callback(lambda _: slots.release())
+                pending.append((future, endpoint, recorded))
+                while pending and pending[0][0].done():
+                    self.collect_future(*pending.popleft())
+            while pending:
+                self.collect_future(*pending.popleft())
+
+    @staticmethod
+    def timestamp(value):
+        """Момент запроса в секундах: число или дата ISO 8601."""
+        if value is None or isinstance(value, (int, float)):
+            return value
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f'Не дата: {value}')
+        return moment.timestamp()
+
+    def cookie(self, username):
+        """Сессия синтетического пользователя, всегда одного и того же."""
+        if not username or not self.accounts:
+            return None
+        pk = self.accounts[
+            zlib.crc32(str(username).encode()) % len(self.accounts)
+        ]
+        if pk not in self.cookies:
+            self.cookies[pk] = session_cookie(User.objects.get(pk=pk))
+        return self.cookies[pk]
+
+    @staticmethod
+    def endpoint(path):
+        try:
+            return resolve(unquote(path)).view_name
+        except Resolver404:
+            return 'не найдено'
+
+    def collect_future(self, future, endpoint, recorded):
+        self.collect(endpoint, recorded, future.result())
+
+    def collect(self, endpoint, recorded, response):
+        status, elapsed, queries = response
+        result = self.results.setdefault(endpoint, {
+            'timings': [], 'recorded': [], 'queries': 0, 'statuses': {},
+        })
+        result['timings'].append(elapsed)
+        result['queries'] += queries
+        if recorded is not None:
+            result['recorded'].append(recorded)
+        statuses = result['statuses']
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def report(self, seconds, top):
+        endpoints = {}
+        timings = []
+        errors = client_errors = 0
+        for endpoint, result in self.results.items():
+            count = len(result['timings'])
+            failed = sum(
+                total for status, total in result['statuses'].items()
+                if status >= 500
+            )
+            errors += failed
+            client_errors += sum(
+                total for status, total in result['statuses'].items()
+                if 400 <= status < 500
+            )
+            timings += result['timings']
+            endpoints[endpoint] = {
+                'requests': count,
+                'statuses': {
+                    str(status): total
+                    for status, total in sorted(result['statuses'].items())
+                },
+                'error_rate': failed / count,
+                'queries_per_request': result['queries'] / count,
+                'latency_ms': summary(result['timings']),
+                'recorded_ms': summary(result['recorded']),
+            }
+        total = len(timings)
+        if not total:
+            raise CommandError('В журнале нет запросов для повтора.')
+        overall = summary(timings)
+        self.stdout.write(
+            f'{total} запросов за {seconds:.1f} с '
+            f'({total / seconds:.0f} в секунду), пропущено {self.skipped}; '
+            f'ошибок 5xx {errors} ({errors / total:.1%}), 4xx {client_errors}'
+        )
+        self.stdout.write(
+            f'p50 {overall["p50"]:.2f} p95 {overall["p95"]:.2f} '
+            f'p99 {overall["p99"]:.2f} мс'
+        )
+        slowest = sorted(
+            endpoints.items(),
+            key=lambda item: item[1]['latency_ms']['p95'],
+            reverse=True,
+        )[:top]
+        self.stdout.write('Самые медленные страницы (p95):')
+        for endpoint, result in slowest:
+            latency = result['latency_ms']
+            recorded = result['recorded_ms']['p95']
+            self.stdout.write(
+                f'  {endpoint:<22} {result["requests"]:>6} запр. '
+                f'p50 {latency["p50"]:7.2f} p95 {latency["p95"]:7.2f} '
+                f'p99 {latency["p99"]:7.2f} мс, '
+                f'ошибок {result["error_rate"]:.1%}'
+                + (f', в журнале p95 {recorded:.2f} мс' if recorded else '')
+            )
+        return {
+            'requests': total,
+            'skipped': self.skipped,
+            'seconds': seconds,
+            'errors': errors,
+            'client_errors': client_errors,
+            'latency_ms': overall,
+            'endpoints': endpoints,
+        }
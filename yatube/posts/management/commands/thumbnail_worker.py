@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.cache_backends import is_shared
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры и варианты картинок из очереди заданий, которые '
+        'добавляются при сохранении постов. Можно запускать несколько '
+        'воркеров одновременно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить накопившиеся задания и выйти.',
+        )
+        parser.add_argument('--batch', type=int, default=20)
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+
+    def handle(self, *args, **options):
+        if not is_shared():
+            raise CommandError(thumbnails.SHARED_CACHE_REQUIRED)
+        total = 0
+        while True:
+            done = thumbnails.run_jobs(options['batch'])
+            total += done
+            if done:
+                continue
+            if options['once']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+        self.stdout.write(f'Выполнено заданий: {total}')
@@ -0,0 +1,76 @@
+import io
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from core.images import normalize
+
+
+def _decode_time(data):
+    start = time.perf_counter()
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Оценивает, сколько места на диске и времени декодирования сэкономила '
+        'бы нормализация загрузок на уже сохранённых картинках постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=os.path.join(settings.MEDIA_ROOT, 'posts'),
+            help='Каталог с картинками, по умолчанию MEDIA_ROOT/posts.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Проверить не больше указанного числа файлов.',
+        )
+
+    def handle(self, *args, **options):
+        files = skipped = 0
+        size_before = size_after = 0
+        decode_before = decode_after = 0.0
+        # scandir отдаёт файлы по одному, не читая весь каталог в память.
+        with os.scandir(options['path']) as entries:
+            for entry in entries:
+                if options['limit'] is not None and files >= options['limit']:
+                    break
+                if not entry.is_file():
+                    continue
+                with open(entry.path, 'rb') as file:
+                    data = file.read()
+                try:
+                    normalized = normalize(
+                        SimpleUploadedFile(entry.name, data)
+                    )
+                except (ValidationError, OSError):
+                    skipped += 1
+                    continue
+                normalized.seek(0)
+                result = normalized.read()
+                files += 1
+                size_before += len(data)
+                size_after += len(result)
+                decode_before += _decode_time(data)
+                decode_after += _decode_time(result)
+        self.stdout.write(f'Файлов: {files}, пропущено: {skipped}')
+        if not files:
+            return
+        self.stdout.write(
+            f'Размер: {size_before / 2 ** 20:.1f} МБ -> '
+            f'{size_after / 2 ** 20:.1f} МБ '
+            f'({size_after / size_before - 1:+.0%})'
+        )
+        self.stdout.write(
+            f'Декодирование: {decode_before * 1000:.0f} мс -> '
+            f'{decode_after * 1000:.0f} мс '
+            f'({decode_after / decode_before - 1:+.0%})'
+        )
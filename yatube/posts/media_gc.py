@@ -0,0 +1,243 @@
+"""Сборка мусора в MEDIA_ROOT.
+
+Оригиналы картинок, на которые не ссылается ни один пост, остаются на
+диске после правки и удаления постов (в том числе каскадного, вместе с
+автором) и после загрузок, чья транзакция откатилась. Вместе с ними
+остаются миниатюры sorl, записи его хранилища ключей и варианты srcset.
+
+Каталоги обходятся потоково через os.scandir, а ссылки проверяются
+пачками по BATCH_SIZE имён одним запросом, поэтому в памяти никогда не
+лежит полный список файлов или путей. Файлы моложе min_age не трогаются:
+их пост мог ещё не закоммититься.
+"""
+import os
+import time
+from functools import partial
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from core.models import StoredFile
+
+from . import variants
+from .models import ImageVariant, Post
+
+BATCH_SIZE = 500
+
+
+def walk(storage, directory):
+    """Файлы каталога хранилища: (имя, размер, mtime), рекурсивно."""
+    root = storage.path(directory)
+    if not os.path.isdir(root):
+        return
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        with os.scandir(storage.path(current)) as entries:
+            for entry in entries:
+                name = f'{current}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _kv_rows(identity):
+    """Строки хранилища ключей sorl одного вида пачками, без OFFSET."""
+    prefix = add_prefix('', identity)
+    last = prefix
+    while True:
+        rows = list(
+            KVStore.objects.filter(
+                key__startswith=prefix, key__gt=last
+            ).order_by('key').values_list('key', 'value')[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+@transaction.atomic
+def recount_references():
+    """Пересчитать StoredFile по картинкам постов."""
+    StoredFile.objects.all().delete()
+    references = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(total=Count('pk'))
+    StoredFile.objects.bulk_create(
+        (
+            StoredFile(name=row['image'], references=row['total'])
+            for row in references.iterator()
+        ),
+    )
+
+
+class Collector:
+    def __init__(self, min_age=24 * 60 * 60, sleep=0, dry_run=False):
+        self.min_age = min_age
+        self.sleep = sleep
+        self.dry_run = dry_run
+        self.storage = Post._meta.get_field('image').storage
+        self.stats = {}
+
+    def _count(self, kind, size=0):
+        files, total = self.stats.get(kind, (0, 0))
+        self.stats[kind] = (files + 1, total + size)
+
+    def _throttle(self):
+        if self.sleep:
+            time.sleep(self.sleep)
+
+    def _old_enough(self, mtime):
+        return time.time() - mtime >= self.min_age
+
+    @staticmethod
+    def _referenced(names):
+        """Имена, на которые ссылаются посты или учёт ссылок хранилища."""
+        return set(
+            Post.objects.filter(image__in=names).values_list(
+                'image', flat=True
+            )
+        ) | set(
+            StoredFile.objects.filter(
+                name__in=names, references__gt=0
+            ).values_list('name', flat=True)
+        )
+
+    def _remove_original(self, name):
+        """Удалить оригинал вместе с миниатюрами и вариантами.
+
+        Пока шёл обход, одинаковая загрузка могла снова сослаться на файл
+        (min_age старый файл от этого не защищает), поэтому ссылки
+        перепроверяются под блокировкой строки StoredFile, а файлы
+        удаляются после коммита. Вернёт, удалён ли оригинал.
+        """
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name)
+            # Запрос блокирует строку до конца транзакции.
+            stored.first()
+            if self._referenced([name]):
+                return False
+            stored.delete()
+            transaction.on_commit(partial(self._remove_files, name))
+        return True
+
+    def _remove_files(self, name):
+        default.kvstore.delete(ImageFile(name, default.storage))
+        variants.delete(name)
+        self.storage.delete(name)
+
+    def originals(self, directory='posts'):
+        for batch in batches(walk(self.storage, directory)):
+            referenced = self._referenced([name for name, *_ in batch])
+            for name, size, mtime in batch:
+                if name in referenced or not self._old_enough(mtime):
+                    continue
+                if self.dry_run or self._remove_original(name):
+                    self._count('originals', size)
+            self._throttle()
+
+    def thumbnail_keys(self):
+        """Записи sorl об исчезнувших оригиналах и миниатюрах."""
+        for rows in _kv_rows('image'):
+            images = [deserialize_image_file(value) for _, value in rows]
+            originals = [
+                image.name for image in images
+                if not image.name.startswith(
+                    thumbnail_settings.THUMBNAIL_PREFIX
+                )
+            ]
+            referenced = self._referenced(originals)
+            for image in images:
+                thumbnail = image.name.startswith(
+                    thumbnail_settings.THUMBNAIL_PREFIX
+                )
+                if thumbnail:
+                    stale = not default.storage.exists(image.name)
+                else:
+                    stale = image.name not in referenced
+                if not stale:
+                    continue
+                self._count('keys')
+                if not self.dry_run:
+                    # Для оригинала sorl удаляет и файлы его миниатюр.
+                    default.kvstore.delete(
+                        image, delete_thumbnails=not thumbnail
+                    )
+            self._throttle()
+        for rows in _kv_rows('thumbnails'):
+            sources = {add_prefix(del_prefix(key)): key for key, _ in rows}
+            existing = set(
+                KVStore.objects.filter(key__in=sources).values_list(
+                    'key', flat=True
+                )
+            )
+            for source, key in sources.items():
+                if source in existing:
+                    continue
+                self._count('keys')
+                if not self.dry_run:
+                    default.kvstore._delete_raw(key)
+            self._throttle()
+
+    def thumbnail_files(self):
+        """Файлы миниатюр, о которых не знает хранилище ключей sorl."""
+        directory = thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
+        for batch in batches(walk(default.storage, directory)):
+            keys = {
+                add_prefix(ImageFile(entry[0], default.storage).key): entry
+                for entry in batch
+            }
+            known = set(
+                KVStore.objects.filter(key__in=keys).values_list(
+                    'key', flat=True
+                )
+            )
+            for key, (name, size, mtime) in keys.items():
+                if key in known or not self._old_enough(mtime):
+                    continue
+                self._count('thumbnails', size)
+                if not self.dry_run:
+                    default.storage.delete(name)
+            self._throttle()
+
+    def variant_files(self):
+        """Файлы вариантов srcset без строки ImageVariant."""
+        for batch in batches(walk(default_storage, 'variants')):
+            known = set(
+                ImageVariant.objects.filter(
+                    file__in=[name for name, *_ in batch]
+                ).values_list('file', flat=True)
+            )
+            for name, size, mtime in batch:
+                if name in known or not self._old_enough(mtime):
+                    continue
+                self._count('variants', size)
+                if not self.dry_run:
+                    default_storage.delete(name)
+            self._throttle()
+
+    def collect(self):
+        self.originals()
+        self.thumbnail_keys()
+        self.thumbnail_files()
+        self.variant_files()
+        return self.stats
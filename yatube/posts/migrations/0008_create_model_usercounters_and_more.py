@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    users = User.objects.annotate(
+        num_posts=Count('posts', distinct=True),
+        num_followers=Count('following', distinct=True),
+        num_following=Count('follower', distinct=True),
+    )
+    UserCounters.objects.bulk_create(
+        [
+            UserCounters(
+                user_id=user.pk,
+                posts_count=user.num_posts,
+                followers_count=user.num_followers,
+                following_count=user.num_following,
+            )
+            for user in users.iterator()
+        ],
+    )
+    for group in Group.objects.annotate(num_posts=Count('posts')):
+        Group.objects.filter(pk=group.pk).update(posts_count=group.num_posts)
+    for post in Post.objects.order_by().annotate(
+        num_comments=Count('comments')
+    ):
+        if post.num_comments:
+            Post.objects.filter(pk=post.pk).update(
+                comments_count=post.num_comments
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0007_create_model_timelineentry_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:06
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    references = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(total=Count('pk'))
+    StoredFile.objects.bulk_create(
+        [
+            StoredFile(name=row['image'], references=row['total'])
+            for row in references.iterator()
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_create_model_storedfile'),
+        ('posts', '0010_create_model_imagevariant_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Вы можете загружить картинку к посту', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
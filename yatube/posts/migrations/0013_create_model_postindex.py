@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:14
+
+import core.fts
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+def fill_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.order_by().values_list('id', 'text')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO posts_post_fts (rowid, text) VALUES (%s, %s)',
+            (
+                (post_id, core.fts.document(text))
+                for post_id, text in posts.iterator()
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_create_model_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostIndex',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='posts.Post')),
+                ('text', core.fts.SearchField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_INDEX, 'DROP TABLE posts_post_fts'),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+
+# Не больше переменных в одном запросе, чем позволяет SQLite (999).
+BATCH_SIZE = 500
+
+
+def _count(Follow, field):
+    return Subquery(
+        Follow.objects.filter(**{field: OuterRef('user')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    )
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставить по одной подписке (самой ранней) на пару user, author.
+
+    Сигналы исторических моделей не срабатывают, поэтому счётчики
+    подписок затронутых пользователей пересчитываются здесь же.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    first = Follow.objects.order_by().values('user', 'author').annotate(
+        first=Min('pk')
+    ).values('first')
+    duplicates = Follow.objects.exclude(pk__in=first).order_by(
+        'pk'
+    ).values_list('pk', 'user', 'author')
+    users, authors = set(), set()
+    last = 0
+    while True:
+        # Пачки по pk (keyset): в памяти не больше одной пачки дублей.
+        batch = list(duplicates.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            break
+        Follow.objects.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+        users.update(user for _, user, _ in batch)
+        authors.update(author for _, _, author in batch)
+        last = batch[-1][0]
+    for ids, field, counter in (
+        (sorted(users), 'user', 'following_count'),
+        (sorted(authors), 'author', 'followers_count'),
+    ):
+        for start in range(0, len(ids), BATCH_SIZE):
+            UserCounters.objects.filter(
+                user__in=ids[start:start + BATCH_SIZE]
+            ).update(**{counter: _count(Follow, field)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_create_model_posttag_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created', '-id'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-created', '-id'], name='post_group_created_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_follow_unique_and_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Занято до'),
+        ),
+    ]
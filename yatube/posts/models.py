@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from core.fts import SearchField
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -9,11 +11,32 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для ленты: автор и группа в том же запросе, без колонок,
+        которые карточка поста не показывает."""
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__last_login',
+            'author__is_superuser',
+            'author__email',
+            'author__is_staff',
+            'author__is_active',
+            'author__date_joined',
+            'group__description',
+        )
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -38,13 +61,45 @@ class Post(CreatedModel):
 
     image = models.ImageField(
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         verbose_name='Картинка',
         help_text='Вы можете загружить картинку к посту'
     )
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created']
+        # Ленты автора и группы читаются диапазоном индекса в порядке
+        # курсора (-created, -id), без сортировки.
+        indexes = [
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='post_author_created_idx',
+            ),
+            models.Index(
+                fields=['group', '-created', '-id'],
+                name='post_group_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -68,6 +123,14 @@ class Comment(CreatedModel):
         help_text='Введите текст комментария'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -83,3 +146,209 @@ class Follow(models.Model):
         related_name='following',
         on_delete=models.CASCADE
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    подписчика читается одним диапазоном индекса (user, created, post).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='timeline_user_created_idx',
+            ),
+        ]
+
+
+class PopularAuthor(models.Model):
+    """Автор, посты которого не раскладываются по лентам подписчиков.
+
+    Подписчиков у такого автора больше TIMELINE_FANOUT_LIMIT, и его посты
+    подмешиваются в ленту при чтении (merge on read).
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popular',
+    )
+
+
+class UserCounters(models.Model):
+    """Счётчики пользователя, которые иначе считались бы через COUNT(*).
+
+    Поддерживаются сигналами Post и Follow; расхождения исправляет
+    команда recount_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов', default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Число подписок', default=0
+    )
+
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия картинки поста для srcset.
+
+    Привязана к имени файла, а не к посту: у постов с одной картинкой
+    варианты общие.
+    """
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    FORMATS = (
+        (WEBP, 'WebP'),
+        (JPEG, 'JPEG'),
+    )
+
+    image = models.CharField(verbose_name='Исходная картинка', max_length=100)
+    format = models.CharField(
+        verbose_name='Формат', max_length=4, choices=FORMATS
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+    size = models.PositiveIntegerField(verbose_name='Размер в байтах')
+    file = models.CharField(verbose_name='Файл варианта', max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['image', 'format', 'width'],
+                name='unique_image_variant',
+            ),
+        ]
+
+
+class ThumbnailJob(models.Model):
+    """Картинка, для которой нужно построить миниатюру и варианты.
+
+    Задание добавляется в той же транзакции, что и пост, а выполняет его
+    команда thumbnail_worker в отдельном процессе. Воркер занимает задание
+    до claimed_until и удаляет его только после успешного выполнения:
+    упавший воркер не теряет задание, а другой возьмёт его после срока.
+    """
+    name = models.CharField(
+        verbose_name='Картинка', max_length=100, unique=True
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток', default=0
+    )
+    claimed_until = models.DateTimeField(
+        verbose_name='Занято до', blank=True, null=True
+    )
+
+
+class PostTag(models.Model):
+    """Хештег из текста поста или комментариев к нему.
+
+    Дата поста скопирована в строку, поэтому лента хештега читается одним
+    диапазоном индекса (tag, created, post), как лента подписок.
+    """
+    tag = models.CharField(verbose_name='Хештег', max_length=50)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='tags',
+    )
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'post'], name='unique_post_tag'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', '-created', '-post'],
+                name='post_tag_created_idx',
+            ),
+        ]
+
+
+class Mention(models.Model):
+    """Упоминание пользователя в тексте поста или комментариев к нему."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_mention'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-post'],
+                name='mention_user_created_idx',
+            ),
+        ]
+
+
+class PostIndex(models.Model):
+    """Строка полнотекстового индекса постов (виртуальная таблица FTS5).
+
+    rowid совпадает с id поста, text хранит основы слов текста, а rank —
+    скрытая колонка FTS5 с релевантностью bm25: чем меньше, тем лучше.
+    Индекс обновляется сигналами Post, пересобирается командой
+    rebuild_search_index.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
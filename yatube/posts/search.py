@@ -0,0 +1,53 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — виртуальная таблица FTS5 posts_post_fts (модель PostIndex).
+Стемминг выполняется в Python, поэтому индекс обновляют сигналы Post, а
+не триггеры SQLite. Строки удалённых постов убирает каскад PostIndex.
+"""
+from django.db import connection
+from django.db.models import F
+
+from core.fts import document, match_expression
+
+from .models import Post, PostIndex
+
+BATCH_SIZE = 1000
+
+
+def index(post_id, text):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {PostIndex._meta.db_table} '
+            '(rowid, text) VALUES (%s, %s)',
+            [post_id, document(text)],
+        )
+
+
+def rebuild():
+    """Пересобрать индекс целиком, пачками по BATCH_SIZE постов."""
+    table = PostIndex._meta.db_table
+    posts = Post.objects.order_by('id').values_list('id', 'text')
+    total = 0
+    last = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        while True:
+            batch = list(posts.filter(id__gt=last)[:BATCH_SIZE])
+            if not batch:
+                return total
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, text) VALUES (%s, %s)',
+                [(post_id, document(text)) for post_id, text in batch],
+            )
+            total += len(batch)
+            last = batch[-1][0]
+
+
+def filter_posts(queryset, query):
+    """Посты, в тексте которых есть все слова запроса, с полем rank."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(
+        search_index__text__match=expression
+    ).annotate(rank=F('search_index__rank'))
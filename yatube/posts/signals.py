@@ -0,0 +1,295 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core import generations, pagecache, storage
+
+from . import caching, counters, search, tags, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+# Поля пользователя, которые показываются рядом с его постами.
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, raw, **kwargs):
+    """У каждого пользователя есть строка счётчиков."""
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw, **kwargs):
+    """Запоминает прежние группу, картинку и текст поста.
+
+    По группе переносится счётчик, миниатюра строится только для новой
+    картинки, а поисковый индекс обновляется только для нового текста.
+    """
+    instance._previous_group_id = None
+    instance._previous_image = None
+    instance._previous_text = None
+    if instance.pk and not raw:
+        (
+            instance._previous_group_id,
+            instance._previous_image,
+            instance._previous_text,
+        ) = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image', 'text'
+        ).first() or (None, None, None)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора."""
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw, **kwargs):
+    if not raw and instance.text != instance._previous_text:
+        search.index(instance.pk, instance.text)
+
+
+@receiver(post_save, sender=Post)
+def index_post_tags(sender, instance, created, raw, **kwargs):
+    """Хештеги и упоминания разбираются один раз, при записи текста."""
+    if raw or instance.text == instance._previous_text:
+        return
+    if created:
+        tags.add(instance.pk, instance.created, instance.text)
+    else:
+        tags.reindex([instance.pk])
+
+
+@receiver(pre_save, sender=Post)
+def store_image_dimensions(sender, instance, raw, **kwargs):
+    """Размеры картинки известны без открытия файла при рендеринге."""
+    if raw or instance.image.name == instance._previous_image:
+        return
+    instance.image_width, instance.image_height = (
+        thumbnails.image_dimensions(instance.image)
+        if instance.image else (None, None)
+    )
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnail(sender, instance, raw, **kwargs):
+    """Миниатюра новой картинки строится в фоне, а не при рендеринге."""
+    if raw or not instance.image:
+        return
+    if instance.image.name != instance._previous_image:
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, raw, **kwargs):
+    """Общий файл картинки удаляется вместе с последней ссылкой на него."""
+    if raw or instance.image.name == instance._previous_image:
+        return
+    if instance.image:
+        storage.retain(instance.image.name)
+    if instance._previous_image:
+        release_image(instance._previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        release_image(instance.image.name)
+
+
+def release_image(name):
+    if storage.release(name):
+        thumbnails.discard(name, Post._meta.get_field('image').storage)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.add_to_user(instance.author_id, 'posts_count', 1)
+        counters.add_to_group(instance.group_id, 1)
+    elif instance._previous_group_id != instance.group_id:
+        counters.add_to_group(instance._previous_group_id, -1)
+        counters.add_to_group(instance.group_id, 1)
+
+
+@receiver(post_save, sender=Post)
+def bump_post_generations(sender, instance, **kwargs):
+    """Фрагменты и страницы со старой версией поста больше не отдаются."""
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        forget_post_group(instance.pk)
+    generations.bump(*caching.post_scopes(instance))
+    pagecache.purge(*caching.post_pages(instance, previous_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post_generations(sender, instance, **kwargs):
+    generations.bump(*caching.post_scopes(instance))
+    caching.forget_post_author(instance.pk)
+    forget_post_group(instance.pk)
+    pagecache.purge(*caching.post_pages(instance))
+    # Новые посты меняют версии лент при раскладке, удалённые — здесь.
+    if not timeline.is_popular(instance.author_id):
+        caching.bump_followers(instance.author_id)
+
+
+def forget_post_group(post_id):
+    # Читатель мог закэшировать прежнюю группу до коммита правки.
+    caching.forget_post_group(post_id)
+    transaction.on_commit(partial(caching.forget_post_group, post_id))
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.add_to_user(instance.author_id, 'posts_count', -1)
+    counters.add_to_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.add_to_post(instance.post_id, 1)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment_tags(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        tags.add(instance.post_id, instance.post.created, instance.text)
+    else:
+        tags.reindex([instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def reindex_comment_tags(sender, instance, **kwargs):
+    """Теги пересобираются после коммита: при каскадном удалении поста
+    его строки к этому моменту уже удалены, и reindex ничего не найдёт.
+    """
+    transaction.on_commit(partial(tags.reindex, [instance.post_id]))
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.add_to_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_generations(sender, instance, **kwargs):
+    generations.bump(caching.post_scope(instance.post_id))
+    pagecache.purge(reverse('posts:post_detail', args=[instance.post_id]))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow_profiles(sender, instance, **kwargs):
+    """На страницах профилей показаны счётчики подписок."""
+    pagecache.purge(
+        caching.profile_page(instance.user),
+        caching.profile_page(instance.author),
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_feed(sender, instance, **kwargs):
+    """Подписка меняет состав ленты подписчика."""
+    generations.bump(caching.follow_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=User)
+def purge_deleted_profile(sender, instance, **kwargs):
+    pagecache.purge(caching.profile_page(instance))
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_name(sender, instance, raw, update_fields, **kwargs):
+    """Запоминает прежнее имя; вход (update_fields=last_login) пропускается.
+    """
+    instance._previous_name = None
+    if not instance.pk or raw:
+        return
+    if update_fields is not None and not set(NAME_FIELDS) & update_fields:
+        return
+    instance._previous_name = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def purge_renamed_author(sender, instance, created, raw, **kwargs):
+    """Новое имя автора сразу видно в карточках, лентах, страницах его
+    постов и в комментариях к чужим постам."""
+    previous = getattr(instance, '_previous_name', None)
+    if created or raw or previous is None:
+        return
+    if previous == tuple(getattr(instance, name) for name in NAME_FIELDS):
+        return
+    commented = list(
+        Comment.objects.filter(author=instance).values_list(
+            'post_id', flat=True
+        ).distinct()
+    )
+    generations.bump(
+        caching.user_scope(instance.pk),
+        *[caching.post_scope(pk) for pk in commented],
+    )
+    pagecache.purge(
+        *caching.author_pages(instance, previous[0]),
+        *[reverse('posts:post_detail', args=[pk]) for pk in commented],
+    )
+
+
+@receiver(pre_save, sender=Group)
+def remember_previous_slug(sender, instance, raw, **kwargs):
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def purge_changed_group(sender, instance, created, raw, **kwargs):
+    """Новые название и slug группы сразу видны на её страницах."""
+    if created or raw:
+        return
+    generations.bump(caching.group_scope(instance.pk))
+    pagecache.purge(*caching.group_pages(instance, instance._previous_slug))
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.add_to_user(instance.author_id, 'followers_count', 1)
+        counters.add_to_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw, **kwargs):
+    """После подписки в ленту попадают уже опубликованные посты автора."""
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """После отписки посты автора уходят из ленты."""
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.add_to_user(instance.author_id, 'followers_count', -1)
+    counters.add_to_user(instance.user_id, 'following_count', -1)
@@ -0,0 +1,183 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Записи генерируются в формате dumpdata кусками в отдельных процессах
+(тексты и картинки — самая дорогая часть) и загружаются командой
+import_dump. Популярность авторов подчиняется степенному закону: у
+немногих авторов большая часть постов и подписчиков, как в живой сети.
+"""
+import io
+import itertools
+import json
+import random
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageDraw
+
+from .models import Post
+
+CHUNK_SIZE = 5000
+USERNAME = 'synthetic_{}'
+WORDS = (
+    'пост', 'день', 'город', 'утро', 'вечер', 'книга', 'море', 'дорога',
+    'кофе', 'работа', 'друзья', 'музыка', 'лес', 'зима', 'лето', 'поезд',
+    'письмо', 'окно', 'дождь', 'солнце', 'прогулка', 'история', 'фото',
+    'новость', 'мысль', 'вопрос', 'ответ', 'смысл', 'мечта', 'время',
+)
+TAGS = ('путешествия', 'книги', 'фото', 'дневник', 'музыка', 'кино')
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Лев', 'Нина')
+LAST_NAMES = ('Иванова', 'Петров', 'Смирнова', 'Толстой', 'Орлова')
+
+_plan = None
+
+
+def init(plan):
+    """Инициализатор процесса: план и веса авторов считаются один раз."""
+    global _plan
+    _plan = dict(plan)
+    # Вес автора ранга k — 1 / k^alpha (закон Ципфа).
+    _plan['author_weights'] = list(itertools.accumulate(
+        1 / (rank + 1) ** plan['alpha'] for rank in range(plan['users'])
+    ))
+
+
+def tasks(plan):
+    """Куски работы (вид, начало, конец) по CHUNK_SIZE записей."""
+    for kind in ('group', 'user', 'post', 'comment', 'follow'):
+        total = plan['users'] if kind == 'follow' else plan[kind + 's']
+        for start in range(0, total, CHUNK_SIZE):
+            yield kind, start, min(start + CHUNK_SIZE, total)
+
+
+def generate(task):
+    """Строки JSONL для одного куска."""
+    kind, start, stop = task
+    rng = random.Random(f'{_plan["seed"]}:{kind}:{start}')
+    make = _MAKERS[kind]
+    return [
+        json.dumps(record, ensure_ascii=False) + '\n'
+        for index in range(start, stop)
+        for record in make(rng, index)
+    ]
+
+
+def _record(model, pk, **fields):
+    return {'model': model, 'pk': pk, 'fields': fields}
+
+
+def _author(rng):
+    index = rng.choices(
+        range(_plan['users']), cum_weights=_plan['author_weights']
+    )[0]
+    return _plan['base']['user'] + index
+
+
+def _post_created(index):
+    # Посты равномерно распределены по периоду и идут в порядке pk.
+    return _plan['start'] + _plan['span'] * index / _plan['posts']
+
+
+def _text(rng, words):
+    text = ' '.join(rng.choices(WORDS, k=words)).capitalize()
+    if rng.random() < 0.3:
+        text += ' #' + rng.choice(TAGS)
+    if rng.random() < 0.1:
+        text += ' @' + USERNAME.format(_author(rng))
+    return text
+
+
+def _image(rng):
+    image = Image.new('RGB', (640, 480), tuple(rng.choices(range(256), k=3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(8):
+        x, y = rng.randrange(640), rng.randrange(480)
+        draw.rectangle(
+            (x, y, x + rng.randrange(200), y + rng.randrange(200)),
+            fill=tuple(rng.choices(range(256), k=3)),
+        )
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=80)
+    storage = Post._meta.get_field('image').storage
+    return storage.save('posts/synthetic.jpg', ContentFile(buffer.getvalue()))
+
+
+def _group(rng, index):
+    pk = _plan['base']['group'] + index
+    yield _record(
+        'posts.group', pk,
+        title=f'Группа {pk}',
+        slug=f'synthetic-{pk}',
+        description=_text(rng, 12),
+    )
+
+
+def _user(rng, index):
+    pk = _plan['base']['user'] + index
+    yield _record(
+        'auth.user', pk,
+        username=USERNAME.format(pk),
+        first_name=rng.choice(FIRST_NAMES),
+        last_name=rng.choice(LAST_NAMES),
+        password='!',
+    )
+
+
+def _post(rng, index):
+    group = None
+    if _plan['groups'] and rng.random() < 0.7:
+        group = _plan['base']['group'] + rng.randrange(_plan['groups'])
+    image, width, height = '', None, None
+    if rng.random() < _plan['images']:
+        image, width, height = _image(rng), 640, 480
+    yield _record(
+        'posts.post', _plan['base']['post'] + index,
+        created=_post_created(index).isoformat(),
+        author=_author(rng),
+        group=group,
+        text=_text(rng, rng.randint(5, 60)),
+        image=image,
+        image_width=width,
+        image_height=height,
+    )
+
+
+def _comment(rng, index):
+    post = rng.randrange(_plan['posts'])
+    created = min(
+        _post_created(post) + timedelta(seconds=rng.randrange(86400)),
+        _plan['start'] + _plan['span'],
+    )
+    yield _record(
+        'posts.comment', _plan['base']['comment'] + index,
+        created=created.isoformat(),
+        post=_plan['base']['post'] + post,
+        author=_author(rng),
+        text=_text(rng, rng.randint(2, 20)),
+    )
+
+
+def _follow(rng, index):
+    """Подписки одного пользователя; популярных авторов выбирают чаще."""
+    user = _plan['base']['user'] + index
+    count = min(
+        int(rng.expovariate(1 / _plan['follows'])), _plan['users'] - 1
+    )
+    authors = set()
+    for _ in range(count * 2):
+        if len(authors) == count:
+            break
+        author = _author(rng)
+        if author != user:
+            authors.add(author)
+    # Число подписок заранее не известно, номера назначит база.
+    for author in sorted(authors):
+        yield _record('posts.follow', None, user=user, author=author)
+
+
+_MAKERS = {
+    'group': _group,
+    'user': _user,
+    'post': _post,
+    'comment': _comment,
+    'follow': _follow,
+}
@@ -0,0 +1,88 @@
+"""Хештеги и упоминания, извлечённые из текста при записи.
+
+#тег и @username разбираются из текста поста и комментариев к нему при
+сохранении и хранятся в PostTag и Mention. Страницы хештега и «меня
+упомянули» читают диапазон индекса вместо LIKE по всем постам.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+
+from .models import Comment, Mention, Post, PostTag
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+TAG = re.compile(r'(?<![\w#&])#(\w{1,50})(?!\w)')
+MENTION = re.compile(r'(?<![\w@])@(\w[\w.@+-]{0,149})')
+
+
+def parse(text):
+    """Хештеги (в нижнем регистре) и имена упомянутых пользователей."""
+    tags = {tag.lower() for tag in TAG.findall(text)}
+    # Точка в конце предложения не часть имени: «спасибо, @leo.»
+    usernames = {name.rstrip('.') for name in MENTION.findall(text)}
+    return tags, usernames
+
+
+def _rows(entries):
+    """Строки PostTag и Mention для [(post_id, created, text), ...]."""
+    parsed = []
+    all_usernames = set()
+    for post_id, created, text in entries:
+        tags, usernames = parse(text)
+        parsed.append((post_id, created, tags, usernames))
+        all_usernames |= usernames
+    users = {}
+    if all_usernames:
+        users = dict(
+            User.objects.filter(username__in=all_usernames).values_list(
+                'username', 'id'
+            )
+        )
+    tag_rows, mention_rows = [], []
+    for post_id, created, tags, usernames in parsed:
+        tag_rows += [
+            PostTag(tag=tag, post_id=post_id, created=created)
+            for tag in tags
+        ]
+        mention_rows += [
+            Mention(user_id=users[name], post_id=post_id, created=created)
+            for name in usernames if name in users
+        ]
+    return tag_rows, mention_rows
+
+
+def _save(entries):
+    tag_rows, mention_rows = _rows(entries)
+    # Размер пачки выбирает Django: явный batch_size в Django 2.2 не
+    # ограничивается лимитом SQLite на число SELECT в UNION ALL (500).
+    PostTag.objects.bulk_create(tag_rows, ignore_conflicts=True)
+    Mention.objects.bulk_create(mention_rows, ignore_conflicts=True)
+
+
+def add(post_id, created, text):
+    """Добавить хештеги и упоминания нового текста: поста или комментария."""
+    _save([(post_id, created, text)])
+
+
+def reindex(post_ids):
+    """Пересобрать хештеги и упоминания постов по их текстам целиком."""
+    posts = list(
+        Post.objects.filter(pk__in=post_ids).values_list(
+            'id', 'created', 'text'
+        )
+    )
+    created = {post_id: date for post_id, date, _ in posts}
+    comments = Comment.objects.filter(post_id__in=created).values_list(
+        'post_id', 'text'
+    )
+    PostTag.objects.filter(post_id__in=post_ids).delete()
+    Mention.objects.filter(post_id__in=post_ids).delete()
+    _save(
+        posts + [
+            (post_id, created[post_id], text)
+            for post_id, text in comments.iterator()
+        ]
+    )
+    return len(posts)
@@ -0,0 +1,324 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.models import StoredFile
+
+from ..models import (
+    Comment, Follow, Group, Post, PostTag, TimelineEntry, UserCounters
+)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportDumpTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def dump(self, records, suffix):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, delete=False, encoding='utf-8'
+        )
+        with file:
+            if suffix == '.jsonl':
+                file.write('\n'.join(json.dumps(record) for record in records))
+            else:
+                json.dump(records, file)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_import_dump(self):
+        """Порядок записей в файле не важен, производные данные
+        пересчитываются, повторная загрузка пропускает дубли.
+        """
+        records = [
+            {'model': 'posts.post', 'pk': 7, 'fields': {
+                'created': '2020-01-01T00:00:00Z', 'text': '#дневник',
+                'author': 5, 'group': 3, 'image': '',
+            }},
+            {'model': 'posts.follow', 'pk': 1, 'fields': {
+                'user': 6, 'author': 5,
+            }},
+            {'model': 'auth.user', 'pk': 5, 'fields': {
+                'username': 'imported', 'password': '!',
+                'groups': [], 'user_permissions': [],
+            }},
+            {'model': 'auth.user', 'pk': 6, 'fields': {
+                'username': 'reader', 'password': '!',
+            }},
+            {'model': 'posts.group', 'pk': 3, 'fields': {
+                'title': 'Группа', 'slug': 'imported', 'description': '',
+            }},
+            {'model': 'thumbnail.kvstore', 'pk': 'x', 'fields': {}},
+        ]
+        call_command(
+            'import_dump', self.dump(records, '.json'), '--batch', '1',
+            '--drop-indexes', stdout=StringIO(),
+        )
+        post = Post.objects.get(pk=7)
+        self.assertEqual(post.created.year, 2020)
+        self.assertEqual(UserCounters.objects.get(user_id=5).posts_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user_id=6, post=post
+        ).exists())
+        self.assertTrue(PostTag.objects.filter(tag='дневник').exists())
+        call_command(
+            'import_dump', self.dump(records, '.jsonl'),
+            '--ignore-conflicts', '--no-signals', stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_import_user_groups_and_permissions(self):
+        permission = Permission.objects.get(codename='add_post')
+        records = [
+            {'model': 'auth.user', 'pk': 5, 'fields': {
+                'username': 'moderator', 'password': '!',
+                'groups': [2], 'user_permissions': [permission.pk],
+            }},
+            {'model': 'auth.group', 'pk': 2, 'fields': {
+                'name': 'Модераторы',
+                'permissions': [['change_post', 'posts', 'post']],
+            }},
+        ]
+        call_command(
+            'import_dump', self.dump(records, '.jsonl'), '--no-signals',
+            stdout=StringIO(),
+        )
+        user = User.objects.get(pk=5)
+        self.assertEqual(
+            list(user.groups.values_list('name', flat=True)), ['Модераторы']
+        )
+        self.assertEqual(
+            user.get_all_permissions(),
+            {'posts.add_post', 'posts.change_post'},
+        )
+
+    def test_duplicate_rows_raise_command_error(self):
+        records = [
+            {'model': 'auth.user', 'pk': pk, 'fields': {
+                'username': f'user{pk}', 'password': '!',
+            }}
+            for pk in (5, 6)
+        ] + [
+            {'model': 'posts.follow', 'pk': pk, 'fields': {
+                'user': 6, 'author': 5,
+            }}
+            for pk in (1, 2)
+        ]
+        with self.assertRaisesMessage(CommandError, '--ignore-conflicts'):
+            call_command(
+                'import_dump', self.dump(records, '.json'), '--no-signals',
+                stdout=StringIO(),
+            )
+        self.assertFalse(User.objects.filter(pk=5).exists())
+
+    def test_import_restores_images(self):
+        """Без сигналов у картинок всё равно есть учёт ссылок и размеры."""
+        buffer = BytesIO()
+        Image.new('RGB', (3, 2), 'white').save(buffer, 'GIF')
+        storage = Post._meta.get_field('image').storage
+        name = storage.save(
+            'posts/imported.gif', ContentFile(buffer.getvalue())
+        )
+        records = [
+            {'model': 'auth.user', 'pk': 5, 'fields': {
+                'username': 'imported', 'password': '!',
+            }},
+        ] + [
+            {'model': 'posts.post', 'pk': pk, 'fields': {
+                'created': '2020-01-01T00:00:00Z', 'text': 'Пост',
+                'author': 5, 'image': name,
+            }}
+            for pk in (1, 2)
+        ]
+        call_command(
+            'import_dump', self.dump(records, '.jsonl'), '--no-signals',
+            '--drop-indexes', stdout=StringIO(),
+        )
+        self.assertEqual(StoredFile.objects.get(name=name).references, 2)
+        self.assertEqual(
+            set(Post.objects.values_list('image_width', 'image_height')),
+            {(3, 2)},
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDataTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_data(self):
+        """Процессы-генераторы дают связный набор с картинками и
+        подписками, а производные данные пересчитаны."""
+        call_command(
+            'generate_data', '--users', '30', '--groups', '2',
+            '--posts', '40', '--comments', '60', '--follows', '5',
+            '--images', '0.1', '--workers', '2', stdout=StringIO(),
+        )
+        storage = Post._meta.get_field('image').storage
+        images = list(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 60)
+        self.assertTrue(images)
+        self.assertTrue(all(storage.exists(name) for name in images))
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        author = Post.objects.first().author_id
+        self.assertEqual(
+            UserCounters.objects.get(user_id=author).posts_count,
+            Post.objects.filter(author=author).count(),
+        )
+        # Повторный запуск добавляет записи после уже существующих.
+        call_command(
+            'generate_data', '--users', '5', '--posts', '5', '--comments',
+            '0', '--images', '0', '--workers', '1', stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 45)
+
+
+class BenchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='benchmarked')
+        cls.reader = User.objects.create_user(username='bench_reader')
+        User.objects.create_user(username='bench_staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Группа', slug='bench-views', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост #замер'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def test_every_read_view_is_measured(self):
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        call_command(
+            'bench_views', '--requests', '3', '--concurrency', '1',
+            '--output', output.name, stdout=StringIO(),
+        )
+        with open(output.name, encoding='utf-8') as file:
+            report = json.load(file)
+        views = report['views']
+        self.assertGreater(report['peak_rss_mb'], 0)
+        self.assertNotIn('profile_follow', views)
+        self.assertEqual(views['follow_index']['statuses'], {'200': 3})
+        self.assertEqual(views['export']['statuses'], {'200': 3})
+        self.assertEqual(
+            views['tag']['path'], reverse('posts:tag', args=['замер'])
+        )
+        self.assertEqual(views['search']['statuses'], {'200': 3})
+        for result in views.values():
+            self.assertLessEqual(
+                result['latency_ms']['p50'], result['latency_ms']['p99']
+            )
+        # Анонимные страницы после первого запроса отдаёт кэш.
+        self.assertEqual(views['index']['queries']['max'], 0)
+        self.assertFalse(Follow.objects.exclude(user=self.reader).exists())
+
+    def test_compare_with_zero_latency(self):
+        previous = tempfile.NamedTemporaryFile(
+            'w', suffix='.json', delete=False
+        )
+        with previous:
+            json.dump(
+                {'views': {'index': {'latency_ms': {'p95': 0}}}}, previous
+            )
+        self.addCleanup(os.remove, previous.name)
+        output = StringIO()
+        call_command(
+            'bench_views', '--requests', '1', '--concurrency', '1',
+            '--views', 'index', '--compare', previous.name, stdout=output,
+        )
+        self.assertIn('(n/a)', output.getvalue())
+
+
+class ReplayLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User.objects.create_user(username='real_user')
+        cls.accounts = [
+            User.objects.create_user(username=f'synthetic_{i}')
+            for i in range(3)
+        ]
+
+    def log(self, entries):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.jsonl', delete=False, encoding='utf-8'
+        )
+        with file:
+            for entry in entries:
+                file.write(json.dumps(entry) + '\n')
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_replay_keeps_timing_and_maps_users(self):
+        path = self.log([
+            {'time': 0, 'path': '/', 'duration': 5},
+            {'time': 0.1, 'path': '/follow/', 'user': 'alice'},
+            {'time': 0.2, 'method': 'POST', 'path': '/create/'},
+            {'time': 0.25, 'query': '?q=1'},
+            {'time': 0.3, 'path': '/search/', 'query': '?q=%D0%BF'},
+            {'time': 0.35, 'path': '/search/', 'query': None},
+            {'time': 0.4, 'path': '/missing/'},
+        ])
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        call_command(
+            'replay_log', path, '--speed', '2', '--concurrency', '1',
+            '--output', output.name, stdout=StringIO(),
+        )
+        with open(output.name, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['requests'], 5)
+        self.assertEqual(report['skipped'], 2)
+        self.assertEqual(report['client_errors'], 1)
+        # Интервалы журнала сжаты вдвое: 0.4 с -> 0.2 с.
+        self.assertGreaterEqual(report['seconds'], 0.2)
+        endpoints = report['endpoints']
+        # alice вошла под синтетической учётной записью.
+        self.assertEqual(
+            endpoints['posts:follow_index']['statuses'], {'200': 1}
+        )
+        self.assertEqual(endpoints['posts:index']['recorded_ms']['p50'], 5)
+        self.assertEqual(endpoints['posts:search']['statuses'], {'200': 2})
+
+    def test_request_errors_are_not_swallowed(self):
+        """Исключение в потоке пула прерывает повтор, а не теряется."""
+        path = self.log([{'path': '/'}, {'path': '/follow/'}])
+        with mock.patch(
+            'core.loadtest.Driver.request', side_effect=RuntimeError('сбой')
+        ), self.assertRaisesMessage(RuntimeError, 'сбой'):
+            call_command(
+                'replay_log', path, '--speed', '0', '--concurrency', '2',
+                stdout=StringIO(),
+            )
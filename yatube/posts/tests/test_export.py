@@ -0,0 +1,79 @@
+import gzip
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import export
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='exported')
+        cls.staff = User.objects.create_user(
+            username='analyst', is_staff=True
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+            for i in range(5)
+        ]
+        Follow.objects.create(user=cls.staff, author=cls.author)
+
+    def test_rows_are_read_in_keyset_chunks(self):
+        self.assertEqual(
+            [row[0] for row in export.rows('posts', chunk_size=2)],
+            [post.pk for post in self.posts],
+        )
+        since = self.posts[3].created
+        self.assertEqual(
+            [row[0] for row in export.rows('posts', since=since)],
+            [post.pk for post in self.posts[3:]],
+        )
+        with self.assertRaises(ValueError):
+            export.rows('follows', since=since)
+
+    def test_command_writes_dumpdata_jsonl(self):
+        output = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        call_command('export_data', 'posts', '--output', output.name)
+        with open(output.name, encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), len(self.posts))
+        self.assertEqual(records[0]['model'], 'posts.post')
+        self.assertEqual(records[0]['pk'], self.posts[0].pk)
+        self.assertEqual(records[0]['fields']['text'], 'Пост 0')
+        self.assertEqual(records[0]['fields']['author'], self.author.pk)
+
+    def test_view_is_staff_only_and_streams_gzip_csv(self):
+        url = reverse('posts:export', args=['follows'])
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(url, {'format': 'csv', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertIn('follows.csv.gz', response['Content-Disposition'])
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode().splitlines()
+        self.assertEqual(lines, [
+            'id,user,author',
+            f'{Follow.objects.get().pk},{self.staff.pk},{self.author.pk}',
+        ])
+        response = self.client.get(url, {'since': '2020-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:export', args=['users'])
+            ).status_code,
+            404,
+        )
@@ -1,14 +1,21 @@
 from posts.forms import PostForm, CommentForm
 from posts.models import Post, Group, Comment
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+import shutil
+import tempfile
+from io import BytesIO
+from PIL import Image
 
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -27,6 +34,11 @@ class PostFormsTests(TestCase):
         )
         cls.form = PostForm()
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -159,6 +171,58 @@ class PostFormsTests(TestCase):
         )
         self.assertEqual(post.image, Post.objects.first().image.name)
 
+    @staticmethod
+    def camera_photo(size=(300, 200)):
+        """JPEG, который нужно повернуть по EXIF на 90 градусов."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(
+            buffer, 'JPEG', quality=100, exif=exif.tobytes()
+        )
+        return SimpleUploadedFile(
+            'photo.jpeg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    @override_settings(UPLOAD_IMAGE_MAX_SIDE=150)
+    def test_uploaded_image_is_normalized(self):
+        """Картинка уменьшается, поворачивается и теряет EXIF."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': self.camera_photo()},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 150))
+            self.assertFalse(image.getexif())
+        self.assertEqual((post.image_width, post.image_height), (100, 150))
+
+    @override_settings(UPLOAD_IMAGE_MAX_PIXELS=1000)
+    def test_decompression_bomb_is_rejected(self):
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Бомба', 'image': self.camera_photo()},
+        )
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: не больше 1 000 пикселей.',
+        )
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
+
+    def test_truncated_image_is_rejected(self):
+        photo = self.camera_photo().read()
+        truncated = SimpleUploadedFile(
+            'photo.jpeg', photo[:len(photo) // 2], content_type='image/jpeg'
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Обрезок', 'image': truncated},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.filter(text='Обрезок').exists())
+
 
 class CommentFormsTests(TestCase):
     @classmethod
@@ -1,10 +1,33 @@
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache.backends.dummy import DummyCache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedKVStore
+
+from core import generations
+from core.models import StoredFile
 
-from ..models import Group, Post, Comment
+from .. import caching, thumbnails, variants
+from ..media_gc import Collector
+from ..models import (
+    Group, ImageVariant, Post, Comment, Follow, ThumbnailJob, UserCounters
+)
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -112,3 +135,386 @@ class CommentModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     comment._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counted_author')
+        cls.reader = User.objects.create_user(username='counted_reader')
+        cls.group = Group.objects.create(
+            title='Группа со счётчиком',
+            slug='counted',
+            description='Тестовое описание',
+        )
+        cls.group_2 = Group.objects.create(
+            title='Вторая группа',
+            slug='counted_2',
+            description='Тестовое описание',
+        )
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов автора, группы и комментариев
+        следуют за созданием, переносом и удалением.
+        """
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        self.assertEqual(self.counters(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        post.group = self.group_2
+        post.save()
+        self.group.refresh_from_db()
+        self.group_2.refresh_from_db()
+        self.assertEqual(
+            (self.group.posts_count, self.group_2.posts_count), (0, 1)
+        )
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.counters(self.user).posts_count, 0)
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group_2.posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.counters(self.user).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.counters(self.user).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_recount_fixes_drift(self):
+        """recount_counters восстанавливает испорченные счётчики."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        UserCounters.objects.filter(user=self.user).update(posts_count=7)
+        UserCounters.objects.filter(user=self.reader).delete()
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.user).posts_count, 1)
+        self.assertEqual(self.counters(self.reader).posts_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name, color='white'):
+        buffer = BytesIO()
+        Image.new('RGB', (2, 1), color).save(buffer, 'GIF')
+        return SimpleUploadedFile(
+            name=name, content=buffer.getvalue(), content_type='image/gif'
+        )
+
+    def test_thumbnail_is_scheduled_for_new_images_only(self):
+        """Миниатюра ставится в очередь только для новой картинки."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post = Post.objects.create(
+                author=self.user, text='Пост', image=self.upload('a.gif')
+            )
+            self.assertEqual(schedule.call_count, 1)
+            post.text = 'Новый текст'
+            post.save()
+            self.assertEqual(schedule.call_count, 1)
+            post.image = self.upload('b.gif', 'black')
+            post.save()
+            self.assertEqual(schedule.call_count, 2)
+            Post.objects.create(author=self.user, text='Без картинки')
+            self.assertEqual(schedule.call_count, 2)
+
+    def use_shared_cache(self):
+        """Отдельный общий кэш, как у воркера."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_worker_requires_shared_cache(self):
+        """С LocMemCache воркер не запускается, а картинки всё равно
+        только ставятся в очередь, а не строятся в запросе."""
+        with self.assertRaises(CommandError):
+            call_command('thumbnail_worker', '--once', stdout=StringIO())
+        with mock.patch.object(thumbnails, 'prepare') as prepare:
+            post = Post.objects.create(
+                author=self.user, text='Пост', image=self.upload('i.gif')
+            )
+            thumbnails.attach([post])
+        prepare.assert_not_called()
+        self.assertIsNone(post.thumbnail)
+        self.assertTrue(ThumbnailJob.objects.filter(
+            name=post.image.name
+        ).exists())
+
+    def test_failed_job_is_retried(self):
+        """Задание удаляется только после успешной обработки."""
+        self.use_shared_cache()
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('j.gif', 'red')
+        )
+        with mock.patch.object(
+            thumbnails, 'prepare', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            thumbnails.run_jobs(10)
+        job = ThumbnailJob.objects.get(name=post.image.name)
+        self.assertEqual(job.attempts, 1)
+        # Занятое задание другой воркер не берёт до истечения срока.
+        self.assertEqual(thumbnails.run_jobs(10), 0)
+        ThumbnailJob.objects.update(claimed_until=None)
+        with mock.patch.object(
+            thumbnails, 'prepare', return_value=(False, 0)
+        ):
+            self.assertEqual(thumbnails.run_jobs(10), 1)
+        self.assertTrue(ThumbnailJob.objects.exists())
+        ThumbnailJob.objects.update(claimed_until=None)
+        self.assertEqual(thumbnails.run_jobs(10), 1)
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_thumbnail_worker_runs_queued_jobs(self):
+        self.use_shared_cache()
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('h.gif', 'blue')
+        )
+        self.assertTrue(ThumbnailJob.objects.filter(
+            name=post.image.name
+        ).exists())
+        scope = caching.post_scope(post.pk)
+        generation = generations.get_generation(scope)
+        call_command('thumbnail_worker', '--once', stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        thumbnails.attach([post])
+        self.assertIsNotNone(post.thumbnail)
+        # Закэшированная карточка с оригиналом сменилась на новую.
+        self.assertNotEqual(generations.get_generation(scope), generation)
+
+    def test_same_images_are_stored_once(self):
+        """Одинаковые картинки лежат в одном файле, который удаляется
+        вместе с последним ссылающимся на него постом.
+        """
+        with mock.patch.object(thumbnails, 'schedule'), \
+                mock.patch.object(thumbnails, 'discard') as discard:
+            first, second = [
+                Post.objects.create(
+                    author=self.user, text='Пост', image=self.upload(name)
+                )
+                for name in ('same.gif', 'copy.GIF')
+            ]
+            self.assertEqual(first.image.name, second.image.name)
+            self.assertRegex(first.image.name, r'^posts/\w\w/\w{64}\.gif$')
+            first.delete()
+            discard.assert_not_called()
+            second.image = self.upload('other.gif', 'black')
+            second.save()
+            discard.assert_called_once_with(first.image.name, mock.ANY)
+
+    def test_identical_upload_keeps_released_file(self):
+        """Картинку последнего удалённого поста не удаляют после коммита,
+        если её успели загрузить снова."""
+        storage = Post._meta.get_field('image').storage
+        with mock.patch.object(thumbnails, 'schedule'), \
+                mock.patch.object(thumbnails, 'transaction') as transaction:
+            first = Post.objects.create(
+                author=self.user, text='Пост', image=self.upload('m.gif')
+            )
+            first.delete()
+            second = Post.objects.create(
+                author=self.user, text='Пост', image=self.upload('n.gif')
+            )
+        self.assertEqual(second.image.name, first.image.name)
+        remove = transaction.on_commit.call_args[0][0]
+        remove()
+        self.assertTrue(storage.exists(second.image.name))
+        self.assertEqual(
+            StoredFile.objects.get(name=second.image.name).references, 1
+        )
+        second.delete()
+        remove()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_generate(self):
+        """generate строит миниатюру и не падает без исходного файла."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('c.gif')
+        )
+        self.assertTrue(thumbnails.generate(post.image.name))
+        self.assertFalse(thumbnails.generate('posts/missing.gif'))
+
+    def test_dimensions_are_stored(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('d.gif')
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+
+    def test_attach_resolves_page_without_queries(self):
+        """Готовые миниатюры всей страницы находятся без запросов к базе."""
+        posts = [
+            Post.objects.create(
+                author=self.user, text='Пост', image=self.upload(name)
+            )
+            for name in ('e.gif', 'f.gif')
+        ]
+        posts.append(Post.objects.create(author=self.user, text='Пост'))
+        for post in posts[:2]:
+            thumbnails.generate(post.image.name)
+        with self.assertNumQueries(0):
+            thumbnails.attach(posts)
+        for post in posts[:2]:
+            expected = thumbnails.get_thumbnail(
+                post.image.name, thumbnails.GEOMETRY, **thumbnails.OPTIONS
+            )
+            self.assertEqual(post.thumbnail.url, expected.url)
+        self.assertIsNone(posts[2].thumbnail)
+
+    def test_missing_thumbnail_is_found_later(self):
+        """Промах запоминается ненадолго: миниатюра, построенная другим
+        процессом, появляется на странице."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('k.gif', 'navy')
+        )
+        thumbnails.attach([post])
+        self.assertIsNone(post.thumbnail)
+        # Воркер пишет хранилище sorl в базу, а не в кэш этого процесса.
+        with mock.patch.object(
+            CachedKVStore, 'cache', new_callable=mock.PropertyMock,
+            return_value=DummyCache('', {}),
+        ):
+            self.assertTrue(thumbnails.generate(post.image.name))
+        thumbnails.attach([post])
+        self.assertIsNone(post.thumbnail)
+        later = time.time() + thumbnails.MISSING_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            thumbnails.attach([post])
+        self.assertIsNotNone(post.thumbnail)
+
+    def test_variants(self):
+        """Варианты строятся без увеличения и находятся для страницы."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('g.gif')
+        )
+        self.assertEqual(
+            variants.build(post.image.name), len(variants.formats())
+        )
+        self.assertEqual(
+            set(ImageVariant.objects.filter(
+                image=post.image.name
+            ).values_list('width', 'height')),
+            {(2, 1)},
+        )
+        with self.assertNumQueries(0):
+            variants.attach([post])
+        self.assertIn(' 2w', post.variants.jpeg_srcset)
+        self.assertEqual(variants.widths(700), [320, 640, 700])
+
+    def test_missing_variants_are_found_later(self):
+        """Варианты, построенные другим процессом, видны после короткого
+        срока отсутствия."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('l.gif', 'teal')
+        )
+        variants.attach([post])
+        self.assertIsNone(post.variants)
+        with mock.patch.object(variants, 'cache', DummyCache('', {})):
+            variants.build(post.image.name)
+        variants.attach([post])
+        self.assertIsNone(post.variants)
+        later = time.time() + variants.MISSING_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            variants.attach([post])
+        self.assertIsNotNone(post.variants)
+
+    def test_dedup_media(self):
+        """dedup_media сводит одинаковые старые файлы к одному."""
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for name in ('posts/legacy.gif', 'posts/legacy_copy.gif'):
+            names.append(
+                default_storage.save(name, self.upload(name, 'green'))
+            )
+        with mock.patch.object(thumbnails, 'schedule'):
+            posts = [
+                Post.objects.create(author=self.user, text=name, image=name)
+                for name in names
+            ]
+        call_command('dedup_media', stdout=StringIO())
+        for post in posts:
+            post.refresh_from_db()
+        target = posts[0].image.name
+        self.assertEqual(posts[1].image.name, target)
+        self.assertTrue(storage.exists(target))
+        self.assertFalse(any(storage.exists(name) for name in names))
+        self.assertEqual(StoredFile.objects.get(name=target).references, 2)
+        # Повторный запуск не трогает уже перенесённые файлы.
+        output = StringIO()
+        call_command('dedup_media', stdout=output)
+        self.assertIn('Перенесено: 0', output.getvalue())
+        self.assertTrue(storage.exists(target))
+
+    def test_collect_media_garbage(self):
+        """Сборщик удаляет только файлы без ссылок вместе с миниатюрами."""
+        kept, orphan, reused = [
+            default_storage.save(f'posts/gc/{name}', self.upload(name, color))
+            for name, color in (
+                ('kept.gif', 'red'), ('orphan.gif', 'pink'),
+                ('reused.gif', 'gray'),
+            )
+        ]
+        with mock.patch.object(thumbnails, 'schedule'):
+            Post.objects.create(author=self.user, text='Пост', image=kept)
+        # Одинаковая загрузка уже сослалась на файл, а пост ещё не создан.
+        StoredFile.objects.create(name=reused, references=1)
+        thumbnails.generate(orphan)
+        thumbnail = thumbnails.get_thumbnail(
+            orphan, thumbnails.GEOMETRY, **thumbnails.OPTIONS
+        )
+        Collector(min_age=0, dry_run=True).originals('posts/gc')
+        self.assertTrue(default_storage.exists(orphan))
+        Collector(min_age=0).originals('posts/gc')
+        # Файлы удаляются только после коммита.
+        self.assertTrue(default_storage.exists(orphan))
+        collector = Collector(min_age=0)
+        with mock.patch(
+            'django.db.transaction.on_commit', side_effect=lambda func: func()
+        ):
+            collector.originals('posts/gc')
+        self.assertEqual(collector.stats['originals'][0], 1)
+        self.assertTrue(default_storage.exists(kept))
+        self.assertTrue(default_storage.exists(reused))
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        default_storage.delete(kept)
@@ -1,18 +1,34 @@
+import shutil
+import tempfile
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from datetime import date
+from io import StringIO
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 
 
-from posts.models import Post, Group, Comment, Follow
-from posts.views import NUMBER_OF_POSTS
+from core import generations, pagecache
+from posts import cards, tags, thumbnails, variants
+from posts.models import (
+    Post, Group, Comment, Follow, Mention, PopularAuthor, PostTag,
+    TimelineEntry
+)
+from posts.views import COMMENTS_PER_PAGE, NUMBER_OF_POSTS
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -66,10 +82,16 @@ class PostPagesTests(TestCase):
             created=date.today()
         )
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -264,6 +286,7 @@ class PaginatorViewsTest(TestCase):
 
     def setUp(self):
         self.guest_client = Client()
+        cache.clear()
 
     def test_num_of_posts_on_the_pages_is_correct(self):
         """
@@ -280,15 +303,50 @@ class PaginatorViewsTest(TestCase):
         for reverse_name in reverse_names:
             with self.subTest():
                 response = self.guest_client.get(reverse_name)
-                self.assertEqual(
-                    len(response.context['page_obj']), NUMBER_OF_POSTS
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), NUMBER_OF_POSTS)
+                response = self.guest_client.get(
+                    reverse_name,
+                    {'cursor': page_obj.paginator.next_cursor}
                 )
-                response = self.guest_client.get(reverse_name + '?page=2')
                 self.assertEqual(
                     len(response.context['page_obj']), NUM_OF_POSTS_2ND_PAGE
                 )
+                self.assertEqual(response.context['page_obj'].number, 2)
 
+    def test_pages_are_stable_when_new_posts_arrive(self):
+        """Вторая страница не сдвигается, если появились новые посты,
+        а ссылка «назад» ведёт на исходную первую страницу.
+        """
+        second_page = list(
+            Post.objects.order_by('-created', '-id')[NUMBER_OF_POSTS:]
+        )
+        response = self.guest_client.get(reverse('posts:index'))
+        first_page = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': next_cursor}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), second_page)
+        self.assertFalse(page_obj.has_next())
+        response = self.guest_client.get(
+            reverse('posts:index'),
+            {'cursor': page_obj.paginator.previous_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), first_page)
 
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'}
+        )
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), NUMBER_OF_POSTS)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class CacheViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -320,26 +378,50 @@ class CacheViewsTest(TestCase):
             image=cls.uploaded
         )
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
     def test_cache(self):
+        """Лента берётся из кэша, пока пост не изменён через модель;
+        удаление поста сразу меняет ключ фрагмента.
+        """
         response = self.authorized_client.get(reverse('posts:index'))
         context = response.context['page_obj']
         content = response.content
         post = context[0]
         self.assertEqual(post.id, self.post.id)
-        Post.objects.get(pk=post.id).delete()
+        Post.objects.filter(pk=post.id).update(text='Правка мимо сигналов')
         new_response = self.authorized_client.get(reverse('posts:index'))
         new_content = new_response.content
         self.assertEqual(content, new_content)
-        cache.clear()
+        Post.objects.get(pk=post.id).delete()
         new_new_response = self.authorized_client.get(reverse('posts:index'))
         new_new_content = new_new_response.content
         self.assertNotEqual(content, new_new_content)
 
+    def test_group_and_profile_fragments_follow_edits(self):
+        """Правка поста сразу видна на странице группы и профиля."""
+        urls = [
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Отредактированный текст')
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -384,6 +466,21 @@ class FollowViewsTest(TestCase):
         )
         self.assertEqual(Follow.objects.count(), following)
 
+    def test_repeated_follow_keeps_one(self):
+        """Повторная подписка не создаёт вторую запись и не падает."""
+        url = reverse(
+            'posts:profile_follow', kwargs={'username': self.user_2.username}
+        )
+        for _ in range(2):
+            response = self.authorized_client.post(url)
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.user_2).count(),
+            1,
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user_2)
+
     def test_follow_index(self):
         """Пост отображается только у подписчиков."""
         user = self.user
@@ -410,3 +507,765 @@ class FollowViewsTest(TestCase):
         self.assertNotIn(
             post, response.context['page_obj']
         )
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='timeline_reader')
+        cls.author = User.objects.create_user(username='timeline_author')
+        cls.star = User.objects.create_user(username='timeline_star')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Пост до подписки'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка переносит старые посты автора в ленту,
+        новый пост раскладывается сразу, отписка всё убирает.
+        """
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertEqual(self.feed(), [self.old_post])
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_merged_on_read(self):
+        """Посты популярного автора не раскладываются по лентам,
+        но попадают в ленту подписок в правильном порядке.
+        """
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.author, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Звезда')
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            PopularAuthor.objects.filter(author=self.star).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=star_post).exists()
+        )
+        self.assertEqual(self.feed(), [new_post, star_post, self.old_post])
+
+
+class FollowFeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.writer = User.objects.create_user(username='feed_writer')
+        cls.poet = User.objects.create_user(username='feed_poet')
+        cls.reader = User.objects.create_user(username='feed_reader')
+        cls.other_reader = User.objects.create_user(username='feed_other')
+        Follow.objects.create(user=cls.reader, author=cls.writer)
+        Follow.objects.create(user=cls.other_reader, author=cls.poet)
+        cls.prose = Post.objects.create(author=cls.writer, text='Проза')
+        cls.poem = Post.objects.create(author=cls.poet, text='Стихи')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.other_client = Client()
+        self.other_client.force_login(self.other_reader)
+
+    def feed(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj']), [
+            query['sql'] for query in queries
+        ]
+
+    def test_feed_is_cached_per_user_and_version(self):
+        """Лента одного пользователя не достаётся другому, а новая
+        версия ленты появляется после поста, удаления и подписки."""
+        posts, queries = self.feed(self.client)
+        self.assertEqual(posts, [self.prose])
+        self.assertTrue(any('timelineentry' in sql for sql in queries))
+        response = self.other_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Стихи')
+        self.assertNotContains(response, 'Проза')
+        # Состав страницы — из кэша, посты читаются по pk.
+        posts, queries = self.feed(self.client)
+        self.assertEqual(posts, [self.prose])
+        self.assertFalse(any('timelineentry' in sql for sql in queries))
+        sequel = Post.objects.create(author=self.writer, text='Продолжение')
+        self.assertEqual(self.feed(self.client)[0], [sequel, self.prose])
+        self.assertEqual(self.feed(self.other_client)[0], [self.poem])
+        sequel.delete()
+        self.assertEqual(self.feed(self.client)[0], [self.prose])
+        Follow.objects.create(user=self.reader, author=self.poet)
+        self.assertEqual(self.feed(self.client)[0], [self.poem, self.prose])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_changes_version(self):
+        Follow.objects.create(user=self.reader, author=self.poet)
+        self.assertEqual(self.feed(self.client)[0], [self.poem, self.prose])
+        verse = Post.objects.create(author=self.poet, text='Новые стихи')
+        self.assertFalse(TimelineEntry.objects.filter(post=verse).exists())
+        self.assertEqual(
+            self.feed(self.client)[0], [verse, self.poem, self.prose]
+        )
+
+    def test_post_cards_are_shared_and_follow_edits(self):
+        Follow.objects.create(user=self.other_reader, author=self.writer)
+        self.client.get(reverse('posts:follow_index'))
+        version = generations.version(*cards.card_scopes(self.prose))
+        key = cards.card_key(self.prose.pk, version)
+        self.assertIn('Проза', cache.get(key))
+        cache.set(key, 'Карточка из кэша')
+        response = self.other_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Карточка из кэша')
+        self.prose.text = 'Исправленная проза'
+        self.prose.save()
+        response = self.other_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Исправленная проза')
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='card_author')
+        cls.reader = User.objects.create_user(username='card_reader')
+        cls.group = Group.objects.create(
+            title='Группа карточек', slug='cards', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Карточка {i}'
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+        ]
+
+    def key(self, post):
+        return cards.card_key(
+            post.pk, generations.version(*cards.card_scopes(post))
+        )
+
+    def test_pages_share_cards(self):
+        """Карточку, отрендеренную для главной, показывают все ленты."""
+        self.client.get(self.urls[0])
+        for post in self.posts:
+            self.assertIn(post.text, cache.get(self.key(post)))
+        cache.set(self.key(self.posts[0]), 'Карточка из кэша')
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Карточка из кэша')
+                self.assertNotContains(response, self.posts[0].text)
+
+    def test_only_missing_cards_are_rendered(self):
+        """Одна выборка get_many на страницу, рендер — только промахов."""
+        rendering = mock.patch.object(
+            cards, 'render_to_string', wraps=cards.render_to_string
+        )
+        with mock.patch.object(cards, 'cache', wraps=cache) as card_cache, \
+                rendering as render:
+            self.client.get(self.urls[0])
+            self.assertEqual(card_cache.get_many.call_count, 1)
+            self.assertEqual(render.call_count, len(self.posts))
+            self.client.get(self.urls[1])
+            self.assertEqual(card_cache.get_many.call_count, 2)
+            self.assertEqual(render.call_count, len(self.posts))
+            post = Post.objects.get(pk=self.posts[1].pk)
+            post.text = 'Исправленная карточка'
+            post.save()
+            response = self.client.get(self.urls[2])
+            self.assertEqual(render.call_count, len(self.posts) + 1)
+            self.assertEqual(card_cache.set_many.call_count, 2)
+            self.assertEqual(
+                list(card_cache.set_many.call_args[0][0]), [self.key(post)]
+            )
+            self.assertContains(response, 'Исправленная карточка')
+
+
+class FeedQueryCountTest(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='query_author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='query_reader')
+        cls.group = Group.objects.create(
+            title='Группа для подсчёта запросов',
+            slug='queries',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def publish(self, count):
+        for i in range(count):
+            Post.objects.create(
+                author=self.user, group=self.group, text=f'Пост {i}'
+            )
+
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_query_count_is_fixed(self):
+        pages = (
+            (self.guest_client, reverse('posts:index')),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            )),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': self.user.username}
+            )),
+            (self.authorized_client, reverse('posts:follow_index')),
+        )
+        self.publish(1)
+        expected = [self.count_queries(*page) for page in pages]
+        self.publish(NUMBER_OF_POSTS)
+        for (client, url), queries in zip(pages, expected):
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(client, url), queries)
+
+
+class QueryPlanTest(TestCase):
+    """Ленты и комментарии читаются диапазоном индекса, без сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='plan_author')
+        cls.star = User.objects.create_user(username='plan_star')
+        cls.reader = User.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='Группа планов', slug='plans', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        PopularAuthor.objects.create(author=cls.star)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='Пост #план для @plan_reader',
+        )
+        Post.objects.create(author=cls.star, text='Пост звезды')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    @staticmethod
+    def plan(sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def feed_queries(self, url, table):
+        """Планы запросов страницы, которые читают таблицу table."""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        plans = [
+            self.plan(query['sql']) for query in queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM "{table}"' in query['sql']
+        ]
+        self.assertTrue(plans)
+        return plans
+
+    def test_feeds_use_indexes(self):
+        pages = [
+            # Имя индекса по created Django дополняет хешем.
+            (reverse('posts:index'), 'posts_post', ['posts_post_created_']),
+            (
+                reverse('posts:tag', args=['план']),
+                'posts_post',
+                ['post_tag_created_idx'],
+            ),
+            (
+                reverse('posts:mentions'),
+                'posts_post',
+                ['mention_user_created_idx'],
+            ),
+            (
+                reverse('posts:profile', args=[self.author.username]),
+                'posts_post',
+                ['post_author_created_idx'],
+            ),
+            (
+                reverse('posts:group_list', args=[self.group.slug]),
+                'posts_post',
+                ['post_group_created_idx'],
+            ),
+            (
+                reverse('posts:post_detail', args=[self.post.pk]),
+                'posts_comment',
+                ['comment_post_created_idx'],
+            ),
+            # Посты популярного автора в ленте подписок — по его индексу.
+            (
+                reverse('posts:follow_index'),
+                'posts_post',
+                ['timeline_user_created_idx', 'post_author_created_idx'],
+            ),
+        ]
+        for url, table, indexes in pages:
+            with self.subTest(url=url):
+                steps = [
+                    step for plan in self.feed_queries(url, table)
+                    for step in plan
+                ]
+                for index in indexes:
+                    self.assertTrue(any(index in step for step in steps))
+                self.assertFalse(
+                    [step for step in steps if 'TEMP B-TREE' in step]
+                )
+
+    def test_follow_lookup_uses_unique_index(self):
+        sql, params = Follow.objects.filter(
+            user=self.reader, author=self.author
+        ).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('user_id=? AND author_id=?', plan)
+        self.assertNotIn('SCAN', plan)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='page_cache_author')
+        cls.group = Group.objects.create(
+            title='Группа кэша страниц',
+            slug='page_cache',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Исходный текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+
+    def test_anonymous_pages_are_cached_and_purged(self):
+        """Анонимам страницы отдаются из кэша до изменения поста."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                second = self.guest_client.get(url)
+                self.assertEqual(first['X-Page-Cache'], 'MISS')
+                self.assertEqual(second['X-Page-Cache'], 'HIT')
+                self.assertEqual(first.content, second.content)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+                self.assertContains(response, 'Новый текст')
+        self.assertEqual(pagecache.stats()['hits'], len(self.urls))
+
+    def test_comment_purges_post_detail(self):
+        """Новый комментарий сразу виден на странице поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        self.assertContains(self.guest_client.get(url), 'Свежий комментарий')
+
+    def test_group_change_purges_its_pages(self):
+        """Новые название и slug группы сразу видны на её страницах и на
+        странице поста."""
+        for url in self.urls:
+            self.guest_client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        group.slug = 'renamed_page_cache'
+        group.save()
+        new_url = reverse('posts:group_list', kwargs={'slug': group.slug})
+        for url in [self.urls[0], self.urls[3], new_url]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.guest_client.get(self.urls[1]).status_code, 404)
+        response = self.guest_client.get(self.urls[3])
+        self.assertContains(response, 'Переименованная группа')
+        self.assertContains(response, new_url)
+
+    def test_commenter_rename_purges_commented_posts(self):
+        """Новое имя комментатора сразу видно под чужими постами."""
+        commenter = User.objects.create_user(username='old_commenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='Комментарий'
+        )
+        url = self.urls[3]
+        self.assertContains(self.guest_client.get(url), 'old_commenter')
+        commenter.username = 'new_commenter'
+        commenter.save()
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'new_commenter')
+        self.assertNotContains(response, 'old_commenter')
+
+    def test_new_post_purges_author_detail_pages(self):
+        """Число постов автора на страницах других его постов не
+        устаревает."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        self.assertEqual(self.guest_client.get(url)['X-Page-Cache'], 'HIT')
+        Post.objects.create(author=self.user, text='Второй пост')
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, '<span >2</span>')
+
+    def test_ready_thumbnail_purges_pages(self):
+        """Готовая миниатюра сбрасывает страницы с оригиналом."""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/ready.gif')
+        for url in self.urls:
+            self.guest_client.get(url)
+        with mock.patch.object(thumbnails, 'generate', return_value=True), \
+                mock.patch.object(variants, 'build', return_value=0):
+            thumbnails.prepare('posts/ready.gif')
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+
+    def test_authorized_user_bypasses_cache(self):
+        """Авторизованному пользователю страницы не кэшируются."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.authorized_client.get(url)
+                response = self.authorized_client.get(url)
+                self.assertFalse(response.has_header('X-Page-Cache'))
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etag_author')
+        cls.group = Group.objects.create(
+            title='Группа условных запросов',
+            slug='etag',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Текст поста'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+
+    def test_unchanged_page_returns_304_without_queries(self):
+        """Повторный запрос с ETag получает 304 без обращений к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changed_page_gets_new_validators(self):
+        """После правки поста ETag меняется, а Last-Modified
+        отражает время изменения.
+        """
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Другой текст'
+        post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_author_changes_update_validators(self):
+        """Новый пост автора меняет ETag страниц других его постов, а
+        новое имя — ETag лент с его постами."""
+        detail = self.urls[3]
+        etag = self.guest_client.get(detail)['ETag']
+        Post.objects.create(author=self.user, text='Ещё пост')
+        response = self.guest_client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<span >2</span>')
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name, user.last_name = 'Лев', 'Толстой'
+        user.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Лев Толстой')
+
+    def test_login_keeps_validators(self):
+        """Вход пользователя (last_login) не сбрасывает его страницы."""
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        user = User.objects.get(pk=self.user.pk)
+        user.save(update_fields=['last_login'])
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        """Авторизованный пользователь не получает чужой ETag."""
+        url = self.urls[0]
+        etag = self.guest_client.get(url)['ETag']
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_relogin_gets_fresh_csrf_token(self):
+        """После повторного входа страница с формой комментария
+        отдаётся заново, а не 304 со старым csrf-токеном."""
+        client = Client()
+        client.force_login(self.user)
+        detail = self.urls[3]
+        # Первый ответ выставляет cookie CSRF, как страница входа.
+        client.get(detail)
+        etag = client.get(detail)['ETag']
+        response = client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        client.logout()
+        client.force_login(self.user)
+        response = client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='search_author')
+        cls.other = User.objects.create_user(username='search_other')
+        cls.group = Group.objects.create(
+            title='Группа поиска',
+            slug='search',
+            description='Тестовое описание',
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Коты и кошки: про котов, кота и котами любимыми',
+        )
+        cls.cat = Post.objects.create(
+            author=cls.other, text='Один кот спал на окне'
+        )
+        cls.dog = Post.objects.create(author=cls.user, text='Собака лаяла')
+
+    def found(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_is_ranked_and_stemmed(self):
+        self.assertEqual(
+            self.found(q='котом'), [self.cats.pk, self.cat.pk]
+        )
+        self.assertEqual(self.found(q='собаки'), [self.dog.pk])
+        self.assertEqual(self.found(q='кот OR "собака'), [])
+
+    def test_search_filters(self):
+        self.assertEqual(self.found(q='кот', group='search'), [self.cats.pk])
+        self.assertEqual(
+            self.found(q='кот', author='search_other'), [self.cat.pk]
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dog.text = 'Кот лаял'
+        self.dog.save()
+        self.assertEqual(self.found(q='собака'), [])
+        self.assertIn(self.dog.pk, self.found(q='лаять'))
+        self.user.delete()
+        self.assertEqual(self.found(q='кот'), [self.cat.pk])
+
+    def test_search_pages_keep_query(self):
+        for i in range(NUMBER_OF_POSTS):
+            Post.objects.create(author=self.other, text=f'Кот номер {i}')
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;cursor=')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'cursor': next_cursor}
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+
+class TagViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tag_author')
+        cls.reader = User.objects.create_user(username='leo.t')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def tagged(self, tag):
+        response = self.client.get(reverse('posts:tag', args=[tag]))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_parse(self):
+        self.assertEqual(
+            tags.parse('#Python и #python, a#b, &#39; спасибо, @leo.t.'),
+            ({'python'}, {'leo.t'}),
+        )
+
+    def test_tag_and_mention_pages(self):
+        post = Post.objects.create(
+            author=self.user, text='Про #Котов для @leo.t'
+        )
+        other = Post.objects.create(author=self.user, text='Без тегов')
+        Comment.objects.create(
+            post=other, author=self.reader, text='Тоже #коты'
+        )
+        self.assertEqual(self.tagged('котов'), [post.pk])
+        self.assertEqual(self.tagged('КОТЫ'), [other.pk])
+        response = self.authorized_client.get(reverse('posts:mentions'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.text = 'Про #собак'
+        post.save()
+        self.assertEqual(self.tagged('котов'), [])
+        self.assertFalse(Mention.objects.exists())
+
+    def test_tag_pages_are_paginated(self):
+        for i in range(NUMBER_OF_POSTS + 1):
+            Post.objects.create(author=self.user, text=f'#серия {i}')
+        response = self.client.get(reverse('posts:tag', args=['серия']))
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), NUMBER_OF_POSTS)
+        response = self.client.get(
+            reverse('posts:tag', args=['серия']),
+            {'cursor': page_obj.paginator.next_cursor},
+        )
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_index_tags_backfills(self):
+        post = Post.objects.create(author=self.user, text='#старый пост')
+        PostTag.objects.all().delete()
+        call_command('index_tags', '--batch', '1', stdout=StringIO())
+        self.assertEqual(self.tagged('старый'), [post.pk])
+
+
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commented_author')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.commenters = [
+            User.objects.create_user(username=f'commenter_{i}')
+            for i in range(3)
+        ]
+
+    def comment(self, count):
+        for i in range(count):
+            Comment.objects.create(
+                post=self.post,
+                author=self.commenters[i % len(self.commenters)],
+                text=f'Комментарий {i}',
+            )
+
+    def detail_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        return response, len(queries)
+
+    def test_first_chunk_is_inline_and_queries_are_flat(self):
+        self.comment(1)
+        _, expected = self.detail_queries()
+        self.comment(COMMENTS_PER_PAGE + 5)
+        response, queries = self.detail_queries()
+        self.assertEqual(queries, expected)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'js-more-comments')
+
+    def test_next_chunks_come_from_fragment(self):
+        self.comment(COMMENTS_PER_PAGE + 1)
+        response, _ = self.detail_queries()
+        cursor = response.context['comments'].paginator.next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': cursor},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {COMMENTS_PER_PAGE}'],
+        )
+        self.assertNotContains(response, 'js-more-comments')
+        self.assertNotContains(response, '<html')
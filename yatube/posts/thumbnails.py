@@ -0,0 +1,229 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Миниатюра строится не при первом рендеринге ленты, а отдельным процессом:
+сохранение поста с новой картинкой добавляет ThumbnailJob, а команда
+thumbnail_worker выполняет задания; ни запрос публикации, ни рендеринг
+ленты картинку не декодируют. Воркеру нужен общий кэш, иначе готовые
+миниатюры и новые поколения постов не дойдут до веб-процессов. Команда
+generate_thumbnails достраивает миниатюры для уже загруженных картинок.
+
+attach() находит готовые миниатюры сразу для всей страницы ленты одним
+get_many к хранилищу sorl; шаблон берёт URL из post.thumbnail. Пока
+миниатюры нет, показывается оригинал с размерами из Post.image_width и
+Post.image_height, и исходный файл при рендеринге не открывается.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core import generations, pagecache
+from core.storage import forget
+
+from . import caching, variants
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+# Миниатюра карточки поста, прежний {% thumbnail %} в шаблонах.
+GEOMETRY = '960x339'
+OPTIONS = {'padding': True, 'upscale': True}
+
+# Пока миниатюра строится, повторные промахи не ставят её в очередь.
+PENDING_PREFIX = 'thumbnails:pending:'
+PENDING_TIMEOUT = 60 * 10
+
+# Отсутствие миниатюры запоминается ненадолго: её вот-вот построит воркер.
+MISSING_TIMEOUT = 5
+
+# Столько воркер держит задание; после срока его возьмёт другой воркер.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+
+SHARED_CACHE_REQUIRED = (
+    'Нужен общий кэш (core.cache_backends.SQLiteCache): с LocMemCache '
+    'готовые миниатюры и новые поколения постов не видны веб-процессам.'
+)
+
+
+class PrecomputedBackend(ThumbnailBackend):
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры без обращения к хранилищу и оригиналу.
+
+        Опции дополняются так же, как в ThumbnailBackend.get_thumbnail,
+        поэтому имя и ключ совпадают с построенной get_thumbnail.
+        """
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+backend = PrecomputedBackend()
+
+
+def generate(name):
+    """Построить миниатюру картинки; вернуть True, если она готова."""
+    try:
+        thumbnail = get_thumbnail(name, GEOMETRY, **OPTIONS)
+        return default.kvstore.get(thumbnail) is not None
+    except Exception:
+        logger.exception('Не удалось построить миниатюру %s', name)
+        return False
+
+
+def prepare(name):
+    """Миниатюра и адаптивные варианты картинки.
+
+    Вернёт, готова ли миниатюра, и число построенных вариантов.
+    """
+    ready = generate(name)
+    try:
+        built = variants.build(name)
+    except Exception:
+        logger.exception('Не удалось построить варианты %s', name)
+        built = 0
+    if ready or built:
+        # Карточки и страницы с оригиналом вместо миниатюры больше не
+        # отдаются.
+        for post in Post.objects.filter(image=name).select_related('author'):
+            generations.bump(caching.post_scope(post.pk))
+            pagecache.purge(*caching.post_pages(post))
+    return ready, built
+
+
+def schedule(name):
+    """Поставить картинку в очередь thumbnail_worker."""
+    if not name or not settings.THUMBNAIL_PREGENERATE:
+        return
+    ThumbnailJob.objects.bulk_create(
+        [ThumbnailJob(name=name)], ignore_conflicts=True
+    )
+
+
+def run_jobs(limit):
+    """Выполнить до limit свободных заданий очереди; вернуть их число.
+
+    Задание занимается условным UPDATE: из нескольких воркеров его
+    получит только тот, чей UPDATE изменил строку. Удаляется оно после
+    того, как миниатюра или варианты готовы; иначе по истечении
+    CLAIM_TIMEOUT задание возьмут снова, но не больше MAX_ATTEMPTS раз.
+    """
+    now = timezone.now()
+    free = Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)
+    done = 0
+    for job in ThumbnailJob.objects.filter(
+        free, attempts__lt=MAX_ATTEMPTS
+    ).order_by('pk')[:limit]:
+        claimed = ThumbnailJob.objects.filter(
+            free, pk=job.pk, attempts=job.attempts
+        ).update(attempts=F('attempts') + 1, claimed_until=now + CLAIM_TIMEOUT)
+        if not claimed:
+            continue
+        done += 1
+        if any(prepare(job.name)):
+            job.delete()
+        elif job.attempts + 1 >= MAX_ATTEMPTS:
+            logger.error(
+                'Картинка %s не обработана за %d попыток',
+                job.name, MAX_ATTEMPTS,
+            )
+    return done
+
+
+def discard(name, storage):
+    """После коммита удалить картинку, её миниатюры и варианты.
+
+    Картинку не удаляют, если до коммита на неё снова сослались.
+    """
+
+    def remove():
+        if not forget(name):
+            return
+        try:
+            delete(name)
+            variants.delete(name)
+            storage.delete(name)
+        except Exception:
+            logger.exception('Не удалось удалить картинку %s', name)
+
+    transaction.on_commit(remove)
+
+
+def _lookup(keys):
+    """Значения хранилища sorl: одним get_many, недостающие — из базы."""
+    kv_cache = default.kvstore.cache
+    found = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kv_cache.set_many(
+            stored, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        # Отсутствие значения запоминается на MISSING_TIMEOUT, а не на срок
+        # KVStore sorl: иначе процесс не увидел бы миниатюру, построенную
+        # воркером после промаха.
+        kv_cache.set_many(
+            {key: EMPTY_VALUE for key in missing if key not in stored},
+            MISSING_TIMEOUT,
+        )
+        found.update(stored)
+    return {
+        key: value for key, value in found.items() if value != EMPTY_VALUE
+    }
+
+
+def attach(posts):
+    """Проставить постам страницы post.thumbnail (ImageFile или None)."""
+    files = {}
+    for post in posts:
+        post.thumbnail = None
+        if post.image:
+            thumbnail = backend.thumbnail_file(
+                post.image.name, GEOMETRY, **OPTIONS
+            )
+            files.setdefault(add_prefix(thumbnail.key), []).append(post)
+    if not files:
+        return
+    found = _lookup(list(files))
+    for key, posts_with_file in files.items():
+        if key not in found:
+            name = posts_with_file[0].image.name
+            if cache.add(PENDING_PREFIX + name, True, PENDING_TIMEOUT):
+                schedule(name)
+            continue
+        thumbnail = deserialize_image_file(found[key])
+        for post in posts_with_file:
+            post.thumbnail = thumbnail
+
+
+def image_dimensions(image):
+    """Ширина и высота картинки или (None, None), если файл не читается."""
+    try:
+        return image.width, image.height
+    except (OSError, ValueError, SuspiciousFileOperation):
+        return None, None
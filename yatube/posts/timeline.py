@@ -0,0 +1,111 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Пост раскладывается по лентам подписчиков автора при публикации, а лента
+пользователя читается одним диапазоном индекса. У популярных авторов
+подписчиков слишком много, чтобы писать их ленты внутри запроса: такие
+авторы попадают в PopularAuthor, а их посты подмешиваются при чтении.
+Версия ленты для кэша (caching.follow_version) устроена так же: своя
+область подписчика, которую увеличивает раскладка, и области популярных
+авторов.
+"""
+from django.conf import settings
+from django.db.models import F
+
+from core import generations
+
+from . import caching
+from .models import (
+    Follow, PopularAuthor, Post, TimelineEntry, UserCounters
+)
+
+BATCH_SIZE = 1000
+
+
+def is_popular(author_id):
+    """Подписчиков у автора больше, чем допускает раскладка по лентам."""
+    if PopularAuthor.objects.filter(author_id=author_id).exists():
+        return True
+    followers = UserCounters.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if (followers or 0) <= settings.TIMELINE_FANOUT_LIMIT:
+        return False
+    PopularAuthor.objects.get_or_create(author_id=author_id)
+    return True
+
+
+def fan_out(post):
+    """Добавить пост в ленты всех подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = list(
+        Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, created=post.created)
+            for user_id in followers
+        ],
+        ignore_conflicts=True,
+    )
+    generations.bump(*[caching.follow_scope(user_id) for user_id in followers])
+
+
+def backfill(user_id, author_id):
+    """Заполнить ленту подписчика уже опубликованными постами автора."""
+    if is_popular(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by().values_list(
+        'id', 'created'
+    )
+    batch = []
+    for post_id, created in posts.iterator(chunk_size=BATCH_SIZE):
+        batch.append(
+            TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+        )
+        if len(batch) == BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    """Убрать посты автора из ленты бывшего подписчика."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def popular_followed(user):
+    """Популярные авторы, на которых подписан пользователь."""
+    return list(
+        Follow.objects.filter(
+            user=user, author__popular__isnull=False
+        ).values_list('author_id', flat=True)
+    )
+
+
+def feed_sources(user, popular=None):
+    """Выборки, из которых собирается лента подписок пользователя.
+
+    Все выборки отдают посты с ключом (feed_created, feed_post), чтобы
+    пагинатор мог склеить их в одну ленту. popular — уже прочитанный
+    popular_followed(user).
+    """
+    sources = [
+        Post.objects.feed().filter(timeline_entries__user=user).annotate(
+            feed_created=F('timeline_entries__created'),
+            feed_post=F('timeline_entries__post'),
+        )
+    ]
+    if popular is None:
+        popular = popular_followed(user)
+    if popular:
+        sources.append(
+            Post.objects.feed().filter(author_id__in=popular).annotate(
+                feed_created=F('created'), feed_post=F('id')
+            )
+        )
+    return sources
@@ -10,9 +10,17 @@ urlpatterns = [
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/', views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
+    path('search/', views.search_posts, name='search'),
+    path('tags/<str:tag>/', views.tag_posts, name='tag'),
+    path('mentions/', views.mentions, name='mentions'),
+    path('export/<str:table>/', views.export_table, name='export'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/', views.profile_follow,
@@ -0,0 +1,193 @@
+"""Адаптивные варианты картинок постов для srcset.
+
+Для каждой картинки строится несколько ширин (IMAGE_VARIANT_WIDTHS) в
+WebP и в JPEG на случай браузеров без WebP. Браузер по sizes выбирает
+самый узкий подходящий вариант, и телефон не скачивает картинку для
+широкого экрана. Если Pillow собран без WebP, строится только JPEG.
+
+Варианты картинок страницы, как и миниатюры, находятся одним get_many.
+"""
+import hashlib
+import io
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import ImageVariant
+
+CACHE_PREFIX = 'variants:'
+# Готовые варианты живут в общем кэше ограниченно, а их отсутствие —
+# несколько секунд: варианты строит воркер в другом процессе.
+CACHE_TIMEOUT = 60 * 60 * 24
+MISSING_TIMEOUT = 5
+
+Variant = namedtuple('Variant', 'format width height file size')
+
+SAVE_OPTIONS = {
+    ImageVariant.WEBP: {'format': 'WEBP', 'method': 4},
+    ImageVariant.JPEG: {
+        'format': 'JPEG', 'optimize': True, 'progressive': True
+    },
+}
+
+
+def formats():
+    if features.check('webp'):
+        return ImageVariant.WEBP, ImageVariant.JPEG
+    return (ImageVariant.JPEG,)
+
+
+def _digest(name):
+    return hashlib.md5(name.encode()).hexdigest()
+
+
+def _cache_key(name):
+    return CACHE_PREFIX + _digest(name)
+
+
+def variant_path(name, width, format):
+    digest = _digest(name)
+    extension = 'jpg' if format == ImageVariant.JPEG else format
+    return f'variants/{digest[:2]}/{digest}/{width}.{extension}'
+
+
+def widths(source_width):
+    """Ширины вариантов без увеличения; узкая картинка даёт один вариант."""
+    result = [
+        width for width in settings.IMAGE_VARIANT_WIDTHS
+        if width < source_width
+    ]
+    result.append(min(source_width, max(settings.IMAGE_VARIANT_WIDTHS)))
+    return sorted(set(result))
+
+
+def render(source):
+    """Закодировать варианты открытой картинки; вернуть [(Variant, bytes)].
+
+    Файлы не сохраняются, поэтому функцией пользуется и отчёт.
+    """
+    image = ImageOps.exif_transpose(source)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    result = []
+    for width in widths(image.width):
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for format in formats():
+            buffer = io.BytesIO()
+            resized.save(
+                buffer,
+                quality=settings.IMAGE_VARIANT_QUALITY,
+                **SAVE_OPTIONS[format],
+            )
+            data = buffer.getvalue()
+            result.append(
+                (Variant(format, width, height, None, len(data)), data)
+            )
+    return result
+
+
+def build(name):
+    """Построить и сохранить варианты картинки; вернуть их число."""
+    with default_storage.open(name) as file:
+        rendered = render(Image.open(file))
+    variants = []
+    for variant, data in rendered:
+        path = variant_path(name, variant.width, variant.format)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(data))
+        variants.append(variant._replace(file=path))
+    ImageVariant.objects.filter(image=name).delete()
+    ImageVariant.objects.bulk_create(
+        ImageVariant(image=name, **variant._asdict()) for variant in variants
+    )
+    cache.set(_cache_key(name), variants, CACHE_TIMEOUT)
+    return len(variants)
+
+
+def delete(name):
+    """Удалить варианты картинки вместе с файлами."""
+    for path in ImageVariant.objects.filter(image=name).values_list(
+        'file', flat=True
+    ):
+        default_storage.delete(path)
+    ImageVariant.objects.filter(image=name).delete()
+    cache.delete(_cache_key(name))
+
+
+def _lookup(names):
+    keys = {_cache_key(name): name for name in names}
+    found = cache.get_many(keys)
+    result = {keys[key]: variants for key, variants in found.items()}
+    missing = [name for name in names if name not in result]
+    if missing:
+        fetched = {name: [] for name in missing}
+        rows = ImageVariant.objects.filter(image__in=missing).order_by(
+            'width'
+        ).values_list('image', 'format', 'width', 'height', 'file', 'size')
+        for image, *fields in rows:
+            fetched[image].append(Variant(*fields))
+        cache.set_many(
+            {_cache_key(name): value for name, value in fetched.items()
+             if value},
+            CACHE_TIMEOUT,
+        )
+        cache.set_many(
+            {_cache_key(name): value for name, value in fetched.items()
+             if not value},
+            MISSING_TIMEOUT,
+        )
+        result.update(fetched)
+    return result
+
+
+class Variants:
+    """Варианты одной картинки в виде, удобном шаблону."""
+
+    def __init__(self, variants):
+        self.variants = variants
+
+    def _srcset(self, format):
+        return ', '.join(
+            f'{default_storage.url(v.file)} {v.width}w'
+            for v in self.variants if v.format == format
+        )
+
+    @property
+    def webp_srcset(self):
+        return self._srcset(ImageVariant.WEBP)
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset(ImageVariant.JPEG)
+
+    @property
+    def fallback(self):
+        """Самый широкий JPEG: src для браузеров без srcset."""
+        jpegs = [v for v in self.variants if v.format == ImageVariant.JPEG]
+        return max(jpegs, key=lambda v: v.width)
+
+    @property
+    def url(self):
+        return default_storage.url(self.fallback.file)
+
+
+def attach(posts):
+    """Проставить постам страницы post.variants (Variants или None)."""
+    for post in posts:
+        post.variants = None
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    found = _lookup({post.image.name for post in posts})
+    for post in posts:
+        variants = found.get(post.image.name)
+        if variants and any(
+            v.format == ImageVariant.JPEG for v in variants
+        ):
+            post.variants = Variants(variants)
@@ -1,32 +1,60 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import (
+    Http404, HttpResponseBadRequest, StreamingHttpResponse
+)
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
+from django.utils.dateparse import parse_datetime
 
-from .forms import PostForm, CommentForm
+from core.pagecache import anonymous_page_cache, conditional_page
+from core.paginator import CursorPaginator, MergeCursorPaginator
+from .forms import PostForm, CommentForm, SearchForm
 from .models import Post, Group, User, Follow
+from . import caching, cards, export, search, thumbnails, variants
+from .counters import get_counters
+from .timeline import feed_sources, popular_followed
 
 NUMBER_OF_POSTS = 10
+COMMENTS_PER_PAGE = 20
 
 
+def attach_images(posts):
+    """Миниатюры и варианты картинок сразу для всех постов страницы."""
+    thumbnails.attach(posts)
+    variants.attach(posts)
+
+
+def get_page_obj(request, queryset):
+    """Страница ленты по курсору из ?cursor=."""
+    paginator = CursorPaginator(queryset, NUMBER_OF_POSTS)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    cards.attach(page_obj)
+    return page_obj
+
+
+@conditional_page
+@anonymous_page_cache
 def index(request):
     template_name = 'posts/index.html'
-    post_list = Post.objects.all().order_by('-created')
-    paginator = Paginator(post_list, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'page_obj': page_obj,
     }
     return render(request, template_name, context)
 
 
+@conditional_page
+@anonymous_page_cache
 def group_posts(request, slug):
     template_name = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.all().filter(group=group)
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.feed().filter(group=group)
+    page_obj = get_page_obj(request, posts)
     title = 'Записи сообщества'
     context = {
         'group': group,
@@ -36,6 +64,8 @@ def group_posts(request, slug):
     return render(request, template_name, context)
 
 
+@conditional_page
+@anonymous_page_cache
 def profile(request, username):
     template_name = 'posts/profile.html'
     user_profile = get_object_or_404(User, username=username)
@@ -50,30 +80,56 @@ def profile(request, username):
             following = False
     else:
         following = False
-    user_posts = user_profile.posts.all()
-    paginator = Paginator(user_posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    post_counter = user_posts.count()
+    user_posts = user_profile.posts.feed()
+    page_obj = get_page_obj(request, user_posts)
+    counters = get_counters(user_profile.pk)
     title = f'Профайл пользователя {user_profile.get_full_name()}'
     context = {
         'title': title,
         'author': user_profile,
         'page_obj': page_obj,
-        'post_counter': post_counter,
+        'post_counter': counters.posts_count,
+        'counters': counters,
         'following': following,
     }
     return render(request, template_name, context)
 
 
+def get_comments_page(post, cursor=None):
+    """Порция комментариев поста по курсору, авторы — тем же запросом."""
+    comments = post.comments.select_related('author').only(
+        'text', 'created', 'post', 'author__username'
+    )
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=('created', 'id')
+    )
+    return paginator.get_page(cursor)
+
+
+def post_detail_scopes(request, post_id):
+    """Страница поста показывает имя автора, число его постов и группу:
+    они меняются вместе с областями автора и группы, а не с путём
+    страницы."""
+    author_id = caching.post_author(post_id)
+    if author_id is None:
+        return []
+    return [
+        caching.author_scope(author_id),
+        *caching.shown_post_scopes([post_id]),
+    ]
+
+
+@conditional_page(scopes=post_detail_scopes)
+@anonymous_page_cache(scopes=post_detail_scopes)
 def post_detail(request, post_id):
     template_name = 'posts/post_detail.html'
     post = get_object_or_404(Post, id=post_id)
+    attach_images([post])
     post_list = Post.objects.all()
-    post_counter = post_list.filter(author=post.author).count()
+    post_counter = get_counters(post.author_id).posts_count
     title = post.text[:30]
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = get_comments_page(post)
     context = {
         'title': title,
         'post': post,
@@ -81,11 +137,13 @@ def post_detail(request, post_id):
         'post_counter': post_counter,
         'form': form,
         'comments': comments,
+        **caching.fragment_context(caching.post_scope(post.pk)),
     }
     return render(request, template_name, context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     template_name = 'posts/create_post.html'
     form = PostForm(
@@ -107,6 +165,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     template_name = 'posts/create_post.html'
     post = get_object_or_404(Post, pk=post_id)
@@ -128,7 +187,19 @@ def post_edit(request, post_id):
     return render(request, template_name, context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для post_detail."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments_page(post, request.GET.get('cursor')),
+        **caching.fragment_context(caching.post_scope(post.pk)),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -140,15 +211,113 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def get_indexed_page_obj(request, queryset, relation):
+    """Страница ленты, которая читается диапазоном индекса relation.
+
+    Ключ курсора берётся из строк relation (PostTag, Mention), а не из
+    поста, чтобы сортировка шла по тому же индексу, что и отбор.
+    """
+    queryset = queryset.annotate(
+        feed_created=F(f'{relation}__created'),
+        feed_post=F(f'{relation}__post'),
+    )
+    paginator = CursorPaginator(
+        queryset, NUMBER_OF_POSTS, ordering=('-feed_created', '-feed_post')
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    cards.attach(page_obj)
+    return page_obj
+
+
+def tag_posts(request, tag):
+    template_name = 'posts/tag.html'
+    tag = tag.lower()
+    posts = Post.objects.feed().filter(tags__tag=tag)
+    context = {
+        'title': f'Записи с хештегом #{tag}',
+        'tag': tag,
+        'page_obj': get_indexed_page_obj(request, posts, 'tags'),
+    }
+    return render(request, template_name, context)
+
+
+@login_required
+def mentions(request):
+    template_name = 'posts/mentions.html'
+    posts = Post.objects.feed().filter(mentions__user=request.user)
+    context = {
+        'title': 'Упоминания',
+        'page_obj': get_indexed_page_obj(request, posts, 'mentions'),
+    }
+    return render(request, template_name, context)
+
+
+def search_posts(request):
+    """Поиск по тексту постов: лучшие совпадения первыми."""
+    template_name = 'posts/search.html'
+    form = SearchForm(request.GET or None)
+    context = {
+        'title': 'Поиск',
+        'form': form,
+    }
+    if form.is_valid():
+        posts = search.filter_posts(
+            Post.objects.feed(), form.cleaned_data['q']
+        )
+        if form.cleaned_data['group']:
+            posts = posts.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author']
+            )
+        paginator = CursorPaginator(
+            posts, NUMBER_OF_POSTS, ordering=('rank', '-id')
+        )
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+        cards.attach(page_obj)
+        query = request.GET.copy()
+        query.pop('cursor', None)
+        context['page_obj'] = page_obj
+        context['query_string'] = query.urlencode() + '&'
+    return render(request, template_name, context)
+
+
+def get_follow_page_obj(request):
+    """Страница ленты подписок.
+
+    Состав страницы — pk постов и курсоры — кэшируется по пользователю и
+    версии его ленты, а HTML карточек общий для всех (posts.cards), так
+    что кэш не растёт как пользователи × страницы × карточки.
+    """
+    user = request.user
+    popular = popular_followed(user)
+    version = caching.follow_version(user.pk, popular)
+    state = cache.get(
+        caching.follow_page_key(user, version, request.GET.get('cursor'))
+    )
+    if state is not None:
+        paginator = CursorPaginator(Post.objects.feed(), NUMBER_OF_POSTS)
+        return paginator.restore(state)
+    paginator = MergeCursorPaginator(
+        feed_sources(user, popular),
+        NUMBER_OF_POSTS,
+        ordering=('-feed_created', '-feed_post'),
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    # Битый курсор ведёт на первую страницу и не плодит ключи.
+    cache.set(
+        caching.follow_page_key(user, version, paginator.cursor),
+        paginator.state(page_obj),
+        settings.FRAGMENT_CACHE_TIMEOUT,
+    )
+    return page_obj
+
+
 @login_required
 def follow_index(request):
     template_name = 'posts/follow.html'
-    user = request.user
-    authors = Follow.objects.filter(user=user).values('author')
-    posts = Post.objects.filter(author__in=authors)
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_follow_page_obj(request)
+    cards.attach(page_obj)
     context = {
         'page_obj': page_obj,
     }
@@ -156,17 +325,17 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(
-        user=request.user,
-        author=author)
-    if request.user != author and not follow.exists():
-        Follow.objects.create(user=request.user, author=author)
+    if request.user != author:
+        # Повторный запрос не упрётся в unique_follow.
+        Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follow = Follow.objects.filter(
@@ -175,3 +344,34 @@ def profile_unfollow(request, username):
     if request.user != author and follow.exists():
         Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)
+
+
+@staff_member_required
+def export_table(request, table):
+    """Выгрузка таблицы для аналитики потоком, без сборки в памяти."""
+    if table not in export.TABLES:
+        raise Http404
+    format = request.GET.get('format', 'jsonl')
+    if format not in export.FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат.')
+    since = None
+    if request.GET.get('since'):
+        since = parse_datetime(request.GET['since'])
+        if since is None:
+            return HttpResponseBadRequest('since: ожидается дата ISO 8601.')
+    compress = bool(request.GET.get('gzip'))
+    try:
+        chunks = export.stream(table, format, since, compress)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    filename = f'{table}.{format}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        chunks,
+        content_type=(
+            'application/gzip' if compress
+            else 'text/csv' if format == 'csv'
+            else 'application/x-ndjson'
+        ),
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
@@ -106,8 +107,52 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Кэш на SQLite (core.cache_backends) общий для всех воркеров: сбросы
+# страниц и поколений из одного процесса сразу видны остальным, и долгие
+# сроки жизни фрагментов и страниц не оставляют устаревших копий.
+SHARED_CACHE_PATH = os.getenv(
+    'SHARED_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+)
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': SHARED_CACHE_PATH,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
+
+# Больше подписчиков — посты автора не раскладываются по лентам при
+# публикации, а подмешиваются в ленту подписок при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Фрагменты лент версионируются поколениями (posts.caching), поэтому
+# правки видны сразу, а срок жизни фрагмента может быть долгим.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Целые страницы для анонимных посетителей (core.pagecache); устаревшие
+# варианты сбрасываются сигналами при изменении постов.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Миниатюры картинок строит команда thumbnail_worker по очереди заданий
+# (posts.thumbnails), а не первый рендеринг ленты.
+THUMBNAIL_PREGENERATE = True
+
+# Ширины адаптивных вариантов картинок постов (posts.variants) и качество
+# их кодирования в WebP и JPEG.
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+IMAGE_VARIANT_QUALITY = 80
+
+# Загружаемые картинки (core.images): наибольшая сторона после уменьшения,
+# качество и формат перекодирования и предел пикселей против
+# decompression bomb.
+UPLOAD_IMAGE_MAX_SIDE = 2048
+UPLOAD_IMAGE_QUALITY = 85
+UPLOAD_IMAGE_FORMAT = 'JPEG'
+# Прогрессивный JPEG раньше показывается при медленной сети, но
+# декодируется заметно дольше базового (см. upload_normalization_report).
+UPLOAD_IMAGE_PROGRESSIVE = True
+UPLOAD_IMAGE_MAX_PIXELS = 40 * 10 ** 6